@@ -1,10 +1,10 @@
-from database.operations import add_products
-from database.services.rema import fetch
+from database.ingest import run_ingest
 
 
 def daily():
-    new_products_data = fetch()
-    add_products(new_products_data)
+    # Products are streamed from Rema's API and written in batches as they arrive.
+    # Takes the same lock as the in-app scheduler, so runs never overlap.
+    run_ingest()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,26 @@
+"""
+Database commands. The API never changes the schema itself, run this before
+starting it against a new or older database:
+
+    python -m database init
+"""
+
+import argparse
+from database.schema import upgrade_schema
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    init = commands.add_parser(
+        "init", help="Create or upgrade the schema to the latest migration"
+    )
+    init.add_argument("--revision", default="head")
+    args = parser.parse_args()
+
+    if args.command == "init":
+        upgrade_schema(args.revision)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Replays archived snapshots into the database, e.g. to rebuild it from scratch:
+
+    python -m database.backfill --start 2024-01-01 --end 2024-12-31 --workers 8
+
+Snapshots are read, parsed and run through `process_product` in a process
+pool, while the products are added one day at a time in date order, so each
+price and product update is logged on the day it was fetched. The daily
+department metrics and the deal snapshot are refreshed once at the end.
+
+Replaying into a live database only adds the missing history: products that
+were stored from a later day than a snapshot's are left as they are.
+"""
+
+import argparse
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+import os
+from pathlib import Path
+import time
+from typing import Dict, List, Set, Tuple
+from sqlalchemy import Engine, func, select
+from database.deals import refresh_deals_snapshot
+from database.ingest import IngestRunRecorder, ingest_lock
+from database.models import SNAPSHOT_REFRESH_GENERATION, IngestGeneration, Price
+from database.operations import add_products, db_session, get_ingest_engine
+from database.rollups import refresh_stale_department_daily_metrics
+from database.services.archive import list_snapshots
+from database.services.rema import iter_snapshot_products
+
+
+def load_snapshot(path: Path) -> List[dict]:
+    # Runs in a worker process
+    return list(iter_snapshot_products(path))
+
+
+def backfill(
+    start: date | None = None,
+    end: date | None = None,
+    workers: int | None = None,
+    archive_dir: Path | None = None,
+):
+    snapshots = [
+        (day, path)
+        for day, path in list_snapshots(archive_dir)
+        if (start is None or day >= start) and (end is None or day <= end)
+    ]
+    if not snapshots:
+        print("No snapshots to backfill")
+        return
+
+    workers = workers or os.cpu_count() or 1
+    engine = get_ingest_engine()
+    with ingest_lock(engine) as lock_connection:
+        if lock_connection is None:
+            raise SystemExit("An ingest is running, try again when it's done")
+
+        run = IngestRunRecorder(lock_connection, "backfilling")
+        try:
+            moved_departments = set()
+            counts = replay_snapshots(
+                snapshots, workers, engine, run, moved_departments
+            )
+            with db_session(engine) as session:
+                # From the first replayed day with new prices, and every day
+                # of the departments products moved between
+                refresh_stale_department_daily_metrics(session, moved_departments)
+                now = datetime.now()
+                session.add(
+                    IngestGeneration(
+                        kind=SNAPSHOT_REFRESH_GENERATION,
+                        started_at=now,
+                        committed_at=now,
+                        last_price_id=select(func.max(Price.id)).scalar_subquery(),
+                    )
+                )
+                refresh_deals_snapshot(session)
+        except BaseException as e:
+            # Re-raised, so the traceback still reaches the console
+            run.finish("failed", error=f"{type(e).__name__}: {e}")
+            raise
+        run.finish("done", counts)
+
+
+def replay_snapshots(
+    snapshots: List[Tuple[date, Path]],
+    workers: int,
+    engine: Engine,
+    run: IngestRunRecorder,
+    moved_departments: Set[int],
+) -> Dict[str, int]:
+    started = time.perf_counter()
+    counts = Counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Parse a few days ahead of the one being added, but not the whole
+        # archive, which wouldn't fit in memory
+        pending = deque()
+        remaining = iter(snapshots)
+        for day, path in remaining:
+            pending.append((day, executor.submit(load_snapshot, path)))
+            if len(pending) >= workers * 2:
+                break
+
+        while pending:
+            day, products = pending.popleft()
+            next_snapshot = next(remaining, None)
+            if next_snapshot:
+                pending.append(
+                    (next_snapshot[0], executor.submit(load_snapshot, next_snapshot[1]))
+                )
+
+            print(f"Backfilling {day}")
+            counts.update(
+                add_products(
+                    run.count_processed(products.result()),
+                    bind=engine,
+                    refresh_snapshot=False,
+                    refresh_rollups=False,
+                    moved_departments=moved_departments,
+                )
+            )
+
+    print(f"Backfilled {len(snapshots)} days in {time.perf_counter() - started:.0f} s")
+    return dict(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--start", type=date.fromisoformat)
+    parser.add_argument("--end", type=date.fromisoformat)
+    parser.add_argument("--workers", type=int)
+    # SNAPSHOT_ARCHIVE_DIR by default
+    parser.add_argument("--archive-dir", type=Path)
+    args = parser.parse_args()
+    backfill(args.start, args.end, args.workers, args.archive_dir)
+
+
+if __name__ == "__main__":
+    main()
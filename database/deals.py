@@ -0,0 +1,216 @@
+from datetime import datetime
+from sqlalchemy import Float, Select, and_, delete, func, insert, select, true
+from sqlalchemy.orm import Session, aliased
+from database.models import (
+    DealSnapshot,
+    DepartmentPriceSnapshot,
+    Price,
+    Product,
+    SnapshotInfo,
+)
+
+DEALS_SNAPSHOT = "deals"
+
+
+def select_deals(
+    today: datetime,
+    department_id: int | None = None,
+    min_difference_percent: float | None = None,
+    order_by_percent: bool = False,
+    limit: int | None = None,
+    include_upcoming: bool = False,
+) -> Select:
+    """
+    Builds the query comparing each product's current advertised price with its
+    regular price, shared by every discount endpoint.
+
+    - The advertised price is the one valid today with the earliest starting_at.
+    - The regular price is the most recent non-advertised price that started on
+      or before today. Products without one get their advertised price instead.
+
+    Each product appears at most once. Results are ordered by difference_amount,
+    or by difference_percent when `order_by_percent` is set.
+
+    With `include_upcoming`, every advertised price that hasn't ended yet is
+    returned instead, each compared with the regular price from the day it
+    starts, so a product can appear once per advertised price.
+    """
+    advertised_rank = func.row_number().over(
+        partition_by=Price.product_id, order_by=(Price.starting_at, Price.id)
+    )
+    advertised = select(
+        Price.id,
+        Price.product_id,
+        Price.price.label("advertised_price"),
+        Price.starting_at,
+        Price.ending_at,
+        advertised_rank.label("rank"),
+    ).where(Price.is_advertised == True, Price.ending_at >= today)
+    if not include_upcoming:
+        advertised = advertised.where(Price.starting_at <= today)
+    advertised = advertised.cte("advertised")
+    # Only the first advertised price of each product, unless all are wanted
+    selected_advertised = true() if include_upcoming else advertised.c.rank == 1
+
+    # Only rank the regular prices of the selected advertised prices
+    regular_rank = func.row_number().over(
+        partition_by=advertised.c.id,
+        order_by=(Price.starting_at.desc(), Price.id.desc()),
+    )
+    regular = (
+        select(
+            advertised.c.id.label("advertised_id"),
+            Price.price.label("regular_price"),
+            regular_rank.label("rank"),
+        )
+        .join(
+            advertised,
+            and_(advertised.c.product_id == Price.product_id, selected_advertised),
+        )
+        .where(
+            Price.is_advertised == False,
+            Price.starting_at <= func.greatest(advertised.c.starting_at, today),
+        )
+        .cte("regular")
+    )
+
+    regular_price = func.coalesce(
+        regular.c.regular_price, advertised.c.advertised_price
+    )
+    difference_amount = regular_price - advertised.c.advertised_price
+    difference_percent = (
+        difference_amount / func.nullif(regular_price, 0, type_=Float) * 100
+    )
+
+    query = (
+        select(
+            advertised.c.id.label("price_id"),
+            Product.id.label("product_id"),
+            Product.name.label("product_name"),
+            Product.image,
+            Product.department_name,
+            Product.department_id,
+            advertised.c.advertised_price,
+            regular_price.label("regular_price"),
+            advertised.c.starting_at,
+            advertised.c.ending_at,
+            difference_amount.label("difference_amount"),
+            difference_percent.label("difference_percent"),
+        )
+        .join(
+            advertised,
+            and_(advertised.c.product_id == Product.id, selected_advertised),
+        )
+        .outerjoin(
+            regular,
+            and_(regular.c.advertised_id == advertised.c.id, regular.c.rank == 1),
+        )
+    )
+
+    if department_id is not None:
+        query = query.where(Product.department_id == department_id)
+    if min_difference_percent is not None:
+        query = query.where(difference_percent >= min_difference_percent)
+
+    if order_by_percent:
+        query = query.order_by(difference_percent.desc().nulls_last(), Product.id)
+    else:
+        query = query.order_by(difference_amount.desc(), Product.id)
+
+    return query.limit(limit)
+
+
+def select_department_prices() -> Select:
+    return (
+        select(
+            Product.department_id,
+            # Departments are identified by id, so any name of it will do
+            func.max(Product.department_name).label("department_name"),
+            func.avg(Price.price).label("avg_price"),
+            func.min(Price.price).label("min_price"),
+            func.max(Price.price).label("max_price"),
+        )
+        .join(Price, Product.id == Price.product_id)
+        .group_by(Product.department_id)
+    )
+
+
+def refresh_deals_snapshot(session: Session, today: datetime | None = None):
+    """
+    Rebuilds the deal and department price snapshots in one transaction, so
+    readers keep seeing the previous snapshot until the new one is committed.
+
+    Advertised prices that start later are included too, so offers that change
+    before the next ingest, e.g. at midnight, are served from the snapshot.
+    """
+    built_at = today or datetime.now()
+    deals = select_deals(built_at, include_upcoming=True)
+    department_prices = select_department_prices()
+
+    session.execute(delete(DealSnapshot))
+    session.execute(
+        insert(DealSnapshot).from_select(
+            [column.name for column in deals.selected_columns], deals
+        )
+    )
+    session.execute(delete(DepartmentPriceSnapshot))
+    session.execute(
+        insert(DepartmentPriceSnapshot).from_select(
+            [column.name for column in department_prices.selected_columns],
+            department_prices,
+        )
+    )
+    session.merge(SnapshotInfo(name=DEALS_SNAPSHOT, built_at=built_at))
+    session.commit()
+
+    return built_at
+
+
+def select_snapshot_deals(
+    today: datetime,
+    department_id: int | None = None,
+    min_difference_percent: float | None = None,
+    order_by_percent: bool = False,
+    limit: int | None = None,
+) -> Select:
+    """
+    Reads deals from the snapshot, with the same options and ordering as
+    `select_deals`. Only deals valid today are returned, the one starting
+    earliest for each product.
+    """
+    current = (
+        select(DealSnapshot)
+        .where(DealSnapshot.starting_at <= today, DealSnapshot.ending_at >= today)
+        .distinct(DealSnapshot.product_id)
+        .order_by(
+            DealSnapshot.product_id, DealSnapshot.starting_at, DealSnapshot.price_id
+        )
+    )
+    if department_id is not None:
+        current = current.where(DealSnapshot.department_id == department_id)
+    deals = aliased(DealSnapshot, current.subquery("current_deals"))
+
+    query = select(
+        deals.product_id,
+        deals.product_name,
+        deals.image,
+        deals.department_name,
+        deals.department_id,
+        deals.advertised_price,
+        deals.regular_price,
+        deals.starting_at,
+        deals.ending_at,
+        deals.difference_amount,
+        deals.difference_percent,
+    )
+    if min_difference_percent is not None:
+        query = query.where(deals.difference_percent >= min_difference_percent)
+
+    if order_by_percent:
+        query = query.order_by(
+            deals.difference_percent.desc().nulls_last(), deals.product_id
+        )
+    else:
+        query = query.order_by(deals.difference_amount.desc(), deals.product_id)
+
+    return query.limit(limit)
@@ -0,0 +1,18 @@
+"""
+Settings from the environment. `.env` is loaded on the first read instead of at
+import, so importing a module never touches the filesystem for it.
+"""
+
+import functools
+import os
+from dotenv import load_dotenv
+
+
+@functools.cache
+def load_env():
+    load_dotenv()
+
+
+def getenv(name: str, default: str | None = None) -> str | None:
+    load_env()
+    return os.getenv(name, default)
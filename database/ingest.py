@@ -0,0 +1,124 @@
+"""
+One ingest run: fetch the catalogue from Rema into the snapshot archive, add
+the archived day with `add_products`, and export the new prices to Parquet. A Postgres advisory
+lock makes sure only one run, or backfill, happens at a time across every
+process and replica. Progress is written to ingest_runs as the run goes.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime
+import threading
+import traceback
+from typing import Iterable, Iterator
+from sqlalchemy import Connection, Engine, insert, text, update
+from database.ingest_runs import INGEST_LOCK_ID
+from database.models import IngestRun
+from database.operations import add_products, get_ingest_engine
+from database.parquet_export import export_prices_to_parquet
+from database.services import archive_products, iter_snapshot_products
+from database.services.archive import SnapshotWriter
+
+# How often the number of processed products is written while ingesting
+PROGRESS_INTERVAL = 1000
+
+# Keeps the scheduler and manual runs in this process from overlapping
+_run_lock = threading.Lock()
+
+
+@contextmanager
+def ingest_lock(engine: Engine):
+    """
+    Yields the connection holding the ingest lock until the block ends, or
+    None when another process holds it.
+    """
+    # Outside a transaction, so holding the lock doesn't hold a snapshot open,
+    # and run progress written through it is visible right away
+    connection = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+    with connection:
+        locked = connection.scalar(
+            text("SELECT pg_try_advisory_lock(:id)"), {"id": INGEST_LOCK_ID}
+        )
+        try:
+            yield connection if locked else None
+        finally:
+            if locked:
+                connection.execute(
+                    text("SELECT pg_advisory_unlock(:id)"), {"id": INGEST_LOCK_ID}
+                )
+
+
+class IngestRunRecorder:
+    """Writes the progress of one run to ingest_runs, through the lock's connection."""
+
+    def __init__(self, connection: Connection, phase: str) -> None:
+        self.connection = connection
+        self.products_processed = 0
+        self.id = connection.scalar(
+            insert(IngestRun)
+            .values(phase=phase, started_at=datetime.now())
+            .returning(IngestRun.id)
+        )
+
+    def update(self, **values):
+        self.connection.execute(
+            update(IngestRun).where(IngestRun.id == self.id).values(**values)
+        )
+
+    def finish(self, phase: str, counts: dict | None = None, error: str | None = None):
+        self.update(
+            phase=phase,
+            finished_at=datetime.now(),
+            products_processed=self.products_processed,
+            error=error,
+            **(counts or {}),
+        )
+
+    def count_processed(self, products: Iterable[dict]) -> Iterator[dict]:
+        for product in products:
+            self.products_processed += 1
+            if self.products_processed % PROGRESS_INTERVAL == 0:
+                self.update(products_processed=self.products_processed)
+            yield product
+
+
+def run_ingest(products: Iterable[dict] | None = None) -> bool:
+    """
+    Runs one ingest of `products`, or of the live catalogue. Returns False
+    without doing anything when another run holds the lock.
+    """
+    if not _run_lock.acquire(blocking=False):
+        return False
+    try:
+        return _run_ingest_locked(products)
+    finally:
+        _run_lock.release()
+
+
+def _run_ingest_locked(products: Iterable[dict] | None) -> bool:
+    engine = get_ingest_engine()
+    with ingest_lock(engine) as lock_connection:
+        if lock_connection is None:
+            print("Another ingest is running, skipping this one")
+            return False
+
+        run = IngestRunRecorder(lock_connection, "ingesting")
+        try:
+            if products is None:
+                # Archived in full before anything is written, so a database
+                # error leaves a snapshot that a backfill can replay
+                with SnapshotWriter(datetime.now()) as archive:
+                    archive_products(archive)
+                products = iter_snapshot_products(archive.path)
+            counts = add_products(run.count_processed(products), bind=engine)
+            run.update(products_processed=run.products_processed, **counts)
+
+            run.update(phase="exporting")
+            export_prices_to_parquet(bind=engine)
+
+            run.finish("done", counts)
+            return True
+        except Exception as e:
+            # The status endpoint is public, so the traceback only goes to the log
+            traceback.print_exc()
+            run.finish("failed", error=f"{type(e).__name__}: {e}")
+            raise
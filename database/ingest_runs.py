@@ -0,0 +1,41 @@
+"""
+The ingest lock and the ingest_runs table, shared by the process running an
+ingest and every process reporting on it.
+"""
+
+from sqlalchemy import Select, TextClause, func, select, text
+from database.models import IngestRun
+
+# Arbitrary, but the same for every process that ingests
+INGEST_LOCK_ID = 72_001_000
+
+# Phases of a run that hasn't finished
+ACTIVE_PHASES = ("ingesting", "exporting", "backfilling")
+
+
+def select_ingest_lock_held() -> TextClause:
+    """Whether any process holds the ingest lock, i.e. is running an ingest."""
+    # A bigint advisory lock key is split over classid and objid
+    return text(
+        "SELECT EXISTS (SELECT 1 FROM pg_locks WHERE locktype = 'advisory'"
+        " AND classid = 0 AND objid = :id AND objsubid = 1 AND granted)"
+    ).bindparams(id=INGEST_LOCK_ID)
+
+
+def select_try_ingest_xact_lock() -> TextClause:
+    """
+    Takes the ingest lock until the current transaction ends, if no other
+    process holds it, for short jobs that must not overlap an ingest.
+    """
+    return text("SELECT pg_try_advisory_xact_lock(:id)").bindparams(id=INGEST_LOCK_ID)
+
+
+def select_latest_run(phase: str | None = None) -> Select:
+    query = select(IngestRun).order_by(IngestRun.id.desc()).limit(1)
+    if phase is not None:
+        query = query.where(IngestRun.phase == phase)
+    return query
+
+
+def select_last_success_at() -> Select:
+    return select(func.max(IngestRun.finished_at)).where(IngestRun.phase == "done")
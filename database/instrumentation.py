@@ -0,0 +1,74 @@
+"""
+Prometheus metrics for the API's database engine: queries and their duration
+per route, and how busy the connection pool is.
+"""
+
+from contextvars import ContextVar
+import time
+from typing import List, Optional
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+DB_POOL_CHECKOUTS = Counter(
+    "db_pool_checkouts_total", "Connections checked out of the pool"
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent getting a connection from the pool, including opening new ones",
+)
+DB_POOL_SIZE = Gauge("db_pool_size", "Connections the pool keeps open")
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently in use")
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow", "Connections open beyond the pool size, negative when fewer"
+)
+
+
+class QueryStats:
+    """The queries run while handling one request."""
+
+    def __init__(self) -> None:
+        self.durations: List[float] = []
+
+
+# Set by the metrics middleware for the request being handled
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    "current_query_stats", default=None
+)
+
+
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    query_stats = current_query_stats.get()
+    if query_stats is not None:
+        query_stats.durations.append(time.perf_counter() - started)
+
+
+def count_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKOUTS.inc()
+
+
+def instrument_engine(async_engine: AsyncEngine):
+    sync_engine = async_engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+
+    pool = sync_engine.pool
+    event.listen(pool, "checkout", count_checkout)
+    DB_POOL_SIZE.set_function(pool.size)
+    DB_POOL_CHECKED_OUT.set_function(pool.checkedout)
+    DB_POOL_OVERFLOW.set_function(pool.overflow)
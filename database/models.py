@@ -1,5 +1,8 @@
-from datetime import datetime
-from sqlalchemy import ForeignKey
+from datetime import date, datetime
+import hashlib
+import json
+from sqlalchemy import Computed, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from typing import List, Optional
 from sqlalchemy.orm import Mapped, DeclarativeBase, mapped_column, relationship
 
@@ -10,6 +13,22 @@ class Base(DeclarativeBase):
 
 class Price(Base):
     __tablename__ = "prices"
+    __table_args__ = (
+        # Price history of a product, and the natural key used to deduplicate prices
+        Index(
+            "ix_prices_product_id_natural_key",
+            "product_id",
+            "starting_at",
+            "ending_at",
+            "price",
+        ),
+        # Prices valid on a given day
+        Index(
+            "ix_prices_advertised_window", "is_advertised", "starting_at", "ending_at"
+        ),
+        # Prices logged since a given day, for the daily rollups
+        Index("ix_prices_logged_on", "logged_on"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     product_id: Mapped[int] = mapped_column(ForeignKey("products.id"))
@@ -51,12 +70,45 @@ class Price(Base):
         return f"Price(id={self.id!r}, price={self.price!r})"
 
 
+# Name matches rank above underline, which ranks above description
+PRODUCT_SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(underline, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+
+
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # Listings ordered by department and name, with id as a stable tiebreak
+        Index("ix_products_department_id_name_id", "department_id", "name", "id"),
+        Index("ix_products_name", "name"),
+        Index("ix_products_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
+    # Columns that describe the product itself; a change in any of them is stored
+    CONTENT_FIELDS = (
+        "name",
+        "underline",
+        "age_limit",
+        "description",
+        "info",
+        "image",
+        "temperature_zone",
+        "is_self_scale_item",
+        "is_weight_item",
+        "is_available_in_all_stores",
+        "is_batch_item",
+        "department_name",
+        "department_id",
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str]
+    # When the content last changed, and when the product was last fetched
     updated: Mapped[datetime]
+    last_seen: Mapped[datetime]
     underline: Mapped[str]
     age_limit: Mapped[Optional[int]]
     description: Mapped[Optional[str]]
@@ -69,6 +121,13 @@ class Product(Base):
     is_batch_item: Mapped[bool]
     department_name: Mapped[str]
     department_id: Mapped[int]
+    content_hash: Mapped[Optional[str]]
+    # Full-text search document, maintained by the database
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(PRODUCT_SEARCH_VECTOR, persisted=True),
+        deferred=True,
+    )
 
     # Relationship to Price
     prices: Mapped[List["Price"]] = relationship(back_populates="product", uselist=True)
@@ -90,6 +149,151 @@ class Product(Base):
         self.department_name = data["department_name"]
         self.department_id = data["department_id"]
         self.updated = datetime.fromisoformat(data["logged_on"])
+        self.last_seen = self.updated
+        self.content_hash = self.calc_content_hash()
+
+    def calc_content_hash(self) -> str:
+        content = [getattr(self, field) for field in self.CONTENT_FIELDS]
+        return hashlib.sha1(json.dumps(content).encode()).hexdigest()
 
     def __repr__(self) -> str:
         return f"Product(id={self.id!r}, name={self.name!r})"
+
+
+class DealSnapshot(Base):
+    """
+    Current and upcoming deals as computed by `database.deals.select_deals`,
+    one per advertised price, rebuilt after each ingest.
+    """
+
+    __tablename__ = "deal_snapshots"
+
+    price_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    product_id: Mapped[int] = mapped_column(index=True)
+    product_name: Mapped[str]
+    image: Mapped[Optional[str]]
+    department_name: Mapped[str]
+    department_id: Mapped[int] = mapped_column(index=True)
+    advertised_price: Mapped[float]
+    regular_price: Mapped[float]
+    starting_at: Mapped[datetime]
+    ending_at: Mapped[datetime]
+    difference_amount: Mapped[float] = mapped_column(index=True)
+    difference_percent: Mapped[Optional[float]] = mapped_column(index=True)
+
+    def __repr__(self) -> str:
+        return f"DealSnapshot(product_id={self.product_id!r}, advertised_price={self.advertised_price!r})"
+
+
+class DepartmentPriceSnapshot(Base):
+    """Price aggregates per department, rebuilt together with the deal snapshot."""
+
+    __tablename__ = "department_price_snapshots"
+
+    department_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    department_name: Mapped[str]
+    avg_price: Mapped[float]
+    min_price: Mapped[float]
+    max_price: Mapped[float]
+
+    def __repr__(self) -> str:
+        return f"DepartmentPriceSnapshot(department_id={self.department_id!r})"
+
+
+class SnapshotInfo(Base):
+    """When each snapshot was last built."""
+
+    __tablename__ = "snapshot_info"
+
+    name: Mapped[str] = mapped_column(primary_key=True)
+    built_at: Mapped[datetime]
+
+    def __repr__(self) -> str:
+        return f"SnapshotInfo(name={self.name!r}, built_at={self.built_at!r})"
+
+
+class ParquetExport(Base):
+    """The last price id each Parquet export got to, shared by every replica."""
+
+    __tablename__ = "parquet_exports"
+
+    name: Mapped[str] = mapped_column(primary_key=True)
+    last_price_id: Mapped[int]
+    exported_at: Mapped[datetime]
+
+    def __repr__(self) -> str:
+        return (
+            f"ParquetExport(name={self.name!r}, last_price_id={self.last_price_id!r})"
+        )
+
+
+INGEST_GENERATION = "ingest"
+SNAPSHOT_REFRESH_GENERATION = "snapshot_refresh"
+# An ingest that failed after committing some of its batches
+FAILED_INGEST_GENERATION = "failed_ingest"
+
+
+class IngestGeneration(Base):
+    """
+    One row per committed change to the catalogue data. The latest id tells
+    readers whether anything they derived from the data is out of date.
+    """
+
+    __tablename__ = "ingest_generations"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    # INGEST_GENERATION for ingests, or e.g. a manual snapshot refresh
+    kind: Mapped[str] = mapped_column(server_default=INGEST_GENERATION)
+    started_at: Mapped[datetime]
+    committed_at: Mapped[datetime]
+    new_products: Mapped[int] = mapped_column(default=0)
+    new_prices: Mapped[int] = mapped_column(default=0)
+    updated_products: Mapped[int] = mapped_column(default=0)
+    # The highest price id when the daily rollups were brought up to date
+    last_price_id: Mapped[Optional[int]]
+
+    def __repr__(self) -> str:
+        return f"IngestGeneration(id={self.id!r}, committed_at={self.committed_at!r})"
+
+
+class IngestRun(Base):
+    """
+    Progress of each ingest or backfill, written by the process running it,
+    so any process can report it.
+    """
+
+    __tablename__ = "ingest_runs"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    phase: Mapped[str]
+    started_at: Mapped[datetime]
+    finished_at: Mapped[Optional[datetime]]
+    products_processed: Mapped[int] = mapped_column(default=0)
+    new_products: Mapped[int] = mapped_column(default=0)
+    new_prices: Mapped[int] = mapped_column(default=0)
+    updated_products: Mapped[int] = mapped_column(default=0)
+    error: Mapped[Optional[str]]
+
+    def __repr__(self) -> str:
+        return f"IngestRun(id={self.id!r}, phase={self.phase!r})"
+
+
+class DepartmentDailyMetrics(Base):
+    """
+    Price aggregates per department and day, by the day prices were logged on.
+    Only the days touched by an ingest are recomputed.
+    """
+
+    __tablename__ = "department_daily_metrics"
+
+    department_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    day: Mapped[date] = mapped_column(primary_key=True, index=True)
+    department_name: Mapped[str]
+    avg_price: Mapped[float]
+    median_price: Mapped[float]
+    min_price: Mapped[float]
+    max_price: Mapped[float]
+    price_volatility: Mapped[float]
+
+    def __repr__(self) -> str:
+        return f"DepartmentDailyMetrics(department_id={self.department_id!r}, day={self.day!r})"
@@ -1,49 +1,229 @@
-from sqlalchemy import create_engine, Engine
-from sqlalchemy.orm import sessionmaker
-from database.models import Base, Product
+from sqlalchemy import create_engine, Engine, func, make_url, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+from database.deals import refresh_deals_snapshot
+from database.instrumentation import TimedAsyncAdaptedQueuePool, instrument_engine
+from database.models import (
+    FAILED_INGEST_GENERATION,
+    IngestGeneration,
+    Price,
+    Product,
+)
+from database.rollups import refresh_stale_department_daily_metrics
 from database.utils import (
+    chunked,
     create_price_objects,
+    mark_products_seen,
     remove_duplicates,
+    split_new_and_changed_products,
+    update_changed_products,
 )
-import os
-from dotenv import load_dotenv
+from database.env import getenv
+from datetime import datetime
+import functools
+from typing import Dict, Set
+
+
+def get_database_url() -> str:
+    database_url = getenv("DATABASE_URL")
+    if not database_url:
+        raise ValueError("Database Environment variable not found")
+    return database_url
+
+
+def get_async_database_url() -> str:
+    # Set ASYNC_DATABASE_URL when DATABASE_URL has driver-specific options
+    # (e.g. sslmode) that asyncpg doesn't understand.
+    return getenv("ASYNC_DATABASE_URL") or make_url(get_database_url()).set(
+        drivername="postgresql+asyncpg"
+    ).render_as_string(hide_password=False)
+
+
+# Engines are created on first use, so importing this module never loads a
+# database driver or connects
+def get_pool_settings() -> Dict[str, int]:
+    # Connections kept open per engine, and how many more may be opened under load
+    return {
+        "pool_size": int(getenv("DATABASE_POOL_SIZE", "20")),
+        "max_overflow": int(getenv("DATABASE_MAX_OVERFLOW", "40")),
+    }
+
+
+@functools.cache
+def get_engine() -> Engine:
+    """Synchronous engine, used by the ingest jobs."""
+    return create_engine(get_database_url(), **get_pool_settings())
+
+
+@functools.cache
+def get_async_engine() -> AsyncEngine:
+    """Asynchronous engine, used by the routers."""
+    async_engine = create_async_engine(
+        get_async_database_url(),
+        **get_pool_settings(),
+        poolclass=TimedAsyncAdaptedQueuePool,
+    )
+    instrument_engine(async_engine)
+    return async_engine
+
 
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("Database Environment variable not found")
+@functools.cache
+def get_ingest_engine() -> Engine:
+    """
+    Small engine for the scheduled ingest, so it never takes more than two
+    connections: one for the work and one holding the ingest lock.
+    """
+    return create_engine(get_database_url(), pool_size=2, max_overflow=0)
 
-engine: Engine = create_engine(DATABASE_URL, pool_size=20, max_overflow=40)
-db_session: sessionmaker = sessionmaker(bind=engine)
-Base.metadata.create_all(engine)
 
+def db_session(bind: Engine | None = None) -> Session:
+    return Session(bind=bind or get_engine())
 
-def get_db():
-    database = db_session()
-    try:
+
+def async_db_session() -> AsyncSession:
+    return AsyncSession(bind=get_async_engine(), expire_on_commit=False)
+
+
+async def dispose_engines():
+    """Closes the pooled connections of the engines created so far."""
+    if get_async_engine.cache_info().currsize:
+        await get_async_engine().dispose()
+    if get_engine.cache_info().currsize:
+        get_engine().dispose()
+    if get_ingest_engine.cache_info().currsize:
+        get_ingest_engine().dispose()
+
+
+async def get_db():
+    async with async_db_session() as database:
         yield database
-    finally:
-        database.close()
 
 
-def process_product_data(product_data, session):
+def process_product_data(product_data, session, update_existing=True, seen_ids=None):
     product_objs = [Product(product) for product in product_data]
-    products = remove_duplicates(product_objs, session)
+    if update_existing:
+        products, changed_products = split_new_and_changed_products(
+            product_objs, session, seen_ids
+        )
+        moved_departments = update_changed_products(changed_products, session)
+        mark_products_seen(product_objs, session)
+    else:
+        products = remove_duplicates(product_objs, session)
+        changed_products = []
+        moved_departments = set()
 
     price_objs = create_price_objects(product_data)
     prices = remove_duplicates(price_objs, session)
 
-    return products, prices
+    return products, prices, changed_products, moved_departments
+
+
+def add_products(
+    data,
+    batch_size=None,
+    update_existing=True,
+    bind=None,
+    refresh_snapshot=True,
+    refresh_rollups=True,
+    moved_departments: Set[int] | None = None,
+) -> Dict[str, int]:
+    """
+    Adds new products and prices from `data`, committing every `batch_size`
+    products, INGEST_BATCH_SIZE by default.
+    `data` can be a list or a generator such as `iter_products()`, so the catalogue
+    never has to be held in memory all at once.
+
+    With `update_existing`, products whose content hash changed since they were
+    stored get their changed columns updated; unchanged products are not written.
+
+    Writes through `bind` when given, instead of the default engine, and
+    returns the number of new products, new prices and updated products.
+    Without `refresh_snapshot` the deal snapshot is left for the caller to
+    refresh, e.g. once after replaying many days. Likewise without
+    `refresh_rollups` for the daily metrics, with the departments products
+    moved between added to `moved_departments`.
+    """
+    batch_size = batch_size or int(getenv("INGEST_BATCH_SIZE", "2000"))
+    started_at = datetime.now()
+    new_products_count = 0
+    new_prices_count = 0
+    updated_products_count = 0
+    if moved_departments is None:
+        moved_departments = set()
+    # Products already handled by an earlier batch of this run
+    seen_ids = set()
+    committed = False
+    with db_session(bind) as session:
+        try:
+            for batch in chunked(data, batch_size):
+                products, prices, changed_products, moved = process_product_data(
+                    batch, session, update_existing, seen_ids
+                )
+                moved_departments |= moved
+
+                session.add_all(products)
+                session.add_all(prices)
+                session.commit()
+                committed = True
+                # Release the committed objects before the next batch
+                session.expunge_all()
+
+                new_products_count += len(products)
+                new_prices_count += len(prices)
+                updated_products_count += len(changed_products)
+
+            print(f"New products found: {new_products_count}")
+            print(f"New prices found: {new_prices_count}")
+            print(f"Updated products: {updated_products_count}")
 
+            # Including the prices of earlier runs that failed halfway
+            if refresh_rollups:
+                refresh_stale_department_daily_metrics(session, moved_departments)
 
-def add_products(data):
-    with db_session() as session:
-        products, prices = process_product_data(data, session)
+            # Committed together with the snapshot, which tells readers that
+            # anything derived from the previous generation is out of date
+            session.add(
+                IngestGeneration(
+                    started_at=started_at,
+                    committed_at=datetime.now(),
+                    new_products=new_products_count,
+                    new_prices=new_prices_count,
+                    updated_products=updated_products_count,
+                    last_price_id=(
+                        select(func.max(Price.id)).scalar_subquery()
+                        if refresh_rollups
+                        else None
+                    ),
+                )
+            )
 
-        print(f"New products found: {len(products)}")
-        print(f"New prices found: {len(prices)}")
-        session.add_all(products)
-        session.add_all(prices)
-        session.commit()
+            # Today's deals only change when new prices arrive
+            if refresh_snapshot:
+                refresh_deals_snapshot(session)
+                print("Deals snapshot refreshed")
+            else:
+                session.commit()
+            print("done")
+        except Exception:
+            # Readers would otherwise keep serving what the committed batches
+            # replaced; the next ingest rolls up their prices
+            if committed:
+                session.rollback()
+                session.add(
+                    IngestGeneration(
+                        kind=FAILED_INGEST_GENERATION,
+                        started_at=started_at,
+                        committed_at=datetime.now(),
+                        new_products=new_products_count,
+                        new_prices=new_prices_count,
+                        updated_products=updated_products_count,
+                    )
+                )
+                session.commit()
+            raise
 
-        print("done")
+    return {
+        "new_products": new_products_count,
+        "new_prices": new_prices_count,
+        "updated_products": updated_products_count,
+    }
@@ -0,0 +1,177 @@
+"""
+Incremental export of the price history to Parquet, partitioned by the month
+each price was logged in:
+
+    exports/prices/month=2024-05/part-000000001-000051234.parquet
+
+Every run only exports prices with a higher id than the last one exported, and
+adds them as new part files, so existing files are never rewritten. The
+directory can be read as one dataset, e.g. `pandas.read_parquet("exports/prices")`.
+
+The last exported id is kept in the database, so with several replicas,
+PARQUET_EXPORT_DIR must be storage they all share, e.g. a network volume.
+Otherwise each replica's directory only holds the prices it exported itself.
+
+    python -m database.parquet_export
+"""
+
+from datetime import datetime
+import functools
+import json
+from pathlib import Path
+from sqlalchemy import Engine, select
+from sqlalchemy.orm import Session
+from database.models import ParquetExport, Price, Product
+from database.env import getenv
+from database.operations import db_session
+
+PARQUET_EXPORT_CHUNK_SIZE = 100_000
+PRICES_EXPORT = "prices"
+# Where the last exported id was kept before it moved to the database
+LEGACY_STATE_FILE = "_state.json"
+
+
+def parquet_export_dir() -> Path:
+    return Path(getenv("PARQUET_EXPORT_DIR", "exports/prices"))
+
+
+def read_last_exported_id(session: Session, export_dir: Path) -> int:
+    last_price_id = session.scalar(
+        select(ParquetExport.last_price_id).where(ParquetExport.name == PRICES_EXPORT)
+    )
+    if last_price_id is not None:
+        return last_price_id
+    state_path = export_dir / LEGACY_STATE_FILE
+    if not state_path.exists():
+        return 0
+    return json.loads(state_path.read_text())["last_price_id"]
+
+
+def write_last_exported_id(session: Session, last_price_id: int):
+    session.merge(
+        ParquetExport(
+            name=PRICES_EXPORT,
+            last_price_id=last_price_id,
+            exported_at=datetime.now(),
+        )
+    )
+    session.commit()
+
+
+@functools.cache
+def prices_schema():
+    """
+    The schema of every part file. Without it, each file gets the types pandas
+    guesses for its chunk, e.g. a column that is all null in one file and
+    integers in another, and the files no longer read as one dataset.
+    """
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            ("id", pa.int64()),
+            ("product_id", pa.int64()),
+            ("product_name", pa.string()),
+            ("department_id", pa.int64()),
+            ("department_name", pa.string()),
+            ("price", pa.float64()),
+            ("logged_on", pa.timestamp("us")),
+            ("price_over_max_quantity", pa.float64()),
+            ("max_quantity", pa.int64()),
+            ("is_advertised", pa.bool_()),
+            ("is_campaign", pa.bool_()),
+            ("starting_at", pa.timestamp("us")),
+            ("ending_at", pa.timestamp("us")),
+            ("deposit", pa.float64()),
+            ("compare_unit", pa.string()),
+            ("compare_unit_price", pa.float64()),
+            ("consumption_unit", pa.string()),
+            ("consumption_quantity", pa.int64()),
+        ]
+    )
+
+
+def select_prices_after(last_price_id: int):
+    return (
+        select(
+            Price.id,
+            Price.product_id,
+            Product.name.label("product_name"),
+            Product.department_id,
+            Product.department_name,
+            Price.price,
+            Price.logged_on,
+            Price.price_over_max_quantity,
+            Price.max_quantity,
+            Price.is_advertised,
+            Price.is_campaign,
+            Price.starting_at,
+            Price.ending_at,
+            Price.deposit,
+            Price.compare_unit,
+            Price.compare_unit_price,
+            Price.consumption_unit,
+            Price.consumption_quantity,
+        )
+        .join(Product, Product.id == Price.product_id)
+        .where(Price.id > last_price_id)
+        .order_by(Price.id)
+    )
+
+
+def export_prices_to_parquet(
+    export_dir: Path | None = None,
+    chunk_size=PARQUET_EXPORT_CHUNK_SIZE,
+    bind: Engine | None = None,
+) -> int:
+    """
+    Writes the prices added since the last export to new part files, and
+    returns how many were exported. Reads through `bind` when given.
+    """
+    # Only needed here, so the API doesn't pay for importing them
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    export_dir = export_dir or parquet_export_dir()
+    export_dir.mkdir(parents=True, exist_ok=True)
+    exported_count = 0
+
+    with db_session(bind) as session:
+        last_price_id = read_last_exported_id(session, export_dir)
+        while True:
+            # One chunk per transaction, which ends with saving how far it got
+            chunk = pd.read_sql(
+                select_prices_after(last_price_id).limit(chunk_size),
+                session.connection(),
+            )
+            if chunk.empty:
+                break
+            months = chunk["logged_on"].dt.strftime("%Y-%m")
+            for month, prices in chunk.groupby(months):
+                partition_dir = export_dir / f"month={month}"
+                partition_dir.mkdir(exist_ok=True)
+                part_name = f"part-{prices['id'].min():09d}-{prices['id'].max():09d}"
+                tmp_path = partition_dir / f"{part_name}.tmp"
+                table = pa.Table.from_pandas(
+                    prices, schema=prices_schema(), preserve_index=False
+                )
+                pq.write_table(table, tmp_path, compression="zstd")
+                tmp_path.replace(partition_dir / f"{part_name}.parquet")
+
+            # Files first, then the last id, so a crash can't skip prices
+            last_price_id = int(chunk["id"].max())
+            write_last_exported_id(session, last_price_id)
+            exported_count += len(chunk)
+
+    print(f"Prices exported to Parquet: {exported_count}")
+    return exported_count
+
+
+def list_parquet_files(export_dir: Path | None = None):
+    export_dir = export_dir or parquet_export_dir()
+    return sorted(export_dir.glob("month=*/part-*.parquet"))
+
+
+if __name__ == "__main__":
+    export_prices_to_parquet()
@@ -0,0 +1,90 @@
+from datetime import date
+from typing import Iterable
+from sqlalchemy import Select, delete, func, insert, select
+from sqlalchemy.orm import Session
+from database.models import DepartmentDailyMetrics, IngestGeneration, Price, Product
+
+
+def select_department_daily_metrics(
+    since: date | None = None, department_ids: Iterable[int] | None = None
+) -> Select:
+    day = func.date(Price.logged_on)
+    query = (
+        select(
+            Product.department_id,
+            day.label("day"),
+            # Departments are identified by id, so any name of it will do
+            func.max(Product.department_name).label("department_name"),
+            func.avg(Price.price).label("avg_price"),
+            func.percentile_cont(0.5).within_group(Price.price).label("median_price"),
+            func.min(Price.price).label("min_price"),
+            func.max(Price.price).label("max_price"),
+            func.coalesce(func.stddev(Price.price), 0).label("price_volatility"),
+        )
+        .join(Product, Product.id == Price.product_id)
+        .group_by(Product.department_id, day)
+    )
+    if since is not None:
+        query = query.where(Price.logged_on >= since)
+    if department_ids is not None:
+        query = query.where(Product.department_id.in_(department_ids))
+    return query
+
+
+def select_rollup_start() -> Select:
+    """
+    The earliest day with prices added since the rollups were last brought up
+    to date, including prices committed by runs that failed before refreshing
+    them. Every day when no generation has recorded it yet.
+    """
+    last_price_id = (
+        select(IngestGeneration.last_price_id)
+        .where(IngestGeneration.last_price_id.is_not(None))
+        .order_by(IngestGeneration.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    return select(func.min(func.date(Price.logged_on))).where(
+        Price.id > func.coalesce(last_price_id, 0)
+    )
+
+
+def refresh_department_daily_metrics(
+    session: Session,
+    since: date | None = None,
+    department_ids: Iterable[int] | None = None,
+):
+    """
+    Recomputes the daily department metrics from `since` onwards, or every day
+    when `since` is None, of `department_ids` or every department. Doesn't
+    commit, so the caller can commit it together with the ingest it belongs to.
+    """
+    metrics = select_department_daily_metrics(since, department_ids)
+
+    clear = delete(DepartmentDailyMetrics)
+    if since is not None:
+        clear = clear.where(DepartmentDailyMetrics.day >= since)
+    if department_ids is not None:
+        clear = clear.where(DepartmentDailyMetrics.department_id.in_(department_ids))
+    session.execute(clear)
+    session.execute(
+        insert(DepartmentDailyMetrics).from_select(
+            [column.name for column in metrics.selected_columns], metrics
+        )
+    )
+
+
+def refresh_stale_department_daily_metrics(
+    session: Session, moved_departments: Iterable[int] = ()
+):
+    """
+    Recomputes every day of `moved_departments`, since prices count towards
+    their product's current department, and every day with prices that aren't
+    rolled up yet. Doesn't commit either.
+    """
+    if moved_departments:
+        refresh_department_daily_metrics(session, department_ids=moved_departments)
+    rollup_start = session.scalar(select_rollup_start())
+    if rollup_start is not None:
+        refresh_department_daily_metrics(session, since=rollup_start)
+        print("Department metrics refreshed")
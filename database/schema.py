@@ -0,0 +1,10 @@
+from pathlib import Path
+from alembic import command
+from alembic.config import Config
+
+ALEMBIC_CONFIG = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+
+def upgrade_schema(revision: str = "head"):
+    """Creates or upgrades the schema through the Alembic migrations."""
+    command.upgrade(Config(str(ALEMBIC_CONFIG)), revision)
@@ -1 +1,8 @@
-from .rema import fetch, fetch_from_file
+from .rema import (
+    archive_products,
+    fetch,
+    fetch_concurrent,
+    fetch_from_file,
+    iter_products,
+    iter_snapshot_products,
+)
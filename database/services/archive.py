@@ -0,0 +1,86 @@
+"""
+Archive of the raw catalogue as fetched from Rema's API, one gzip-compressed
+NDJSON file per day:
+
+    snapshots/2024-05-01.ndjson.gz
+
+The first line holds when the catalogue was fetched, and every following line
+one raw product with its department. Files are read line by line, so a day is
+never loaded into memory at once.
+
+Each ingest archives to SNAPSHOT_ARCHIVE_DIR on the replica that ran it, so
+with several replicas it must be storage they all share for a backfill to see
+every day.
+"""
+
+from datetime import date, datetime
+import gzip
+import json
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+from database.env import getenv
+
+SNAPSHOT_SUFFIX = ".ndjson.gz"
+
+
+def snapshot_archive_dir() -> Path:
+    return Path(getenv("SNAPSHOT_ARCHIVE_DIR", "snapshots"))
+
+
+def snapshot_path(day: date, archive_dir: Path | None = None) -> Path:
+    archive_dir = archive_dir or snapshot_archive_dir()
+    return archive_dir / f"{day.isoformat()}{SNAPSHOT_SUFFIX}"
+
+
+class SnapshotWriter:
+    """
+    Writes one day's raw catalogue. The file only gets its final name once
+    the writer is closed without an error, so a failed fetch leaves no snapshot.
+    """
+
+    def __init__(self, fetched_at: datetime, archive_dir: Path | None = None):
+        archive_dir = archive_dir or snapshot_archive_dir()
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        self.path = snapshot_path(fetched_at.date(), archive_dir)
+        self.tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self.file = gzip.open(self.tmp_path, "wt", encoding="utf-8", compresslevel=6)
+        self.write_line({"fetched_at": fetched_at.isoformat()})
+
+    def write_line(self, data: Dict):
+        self.file.write(json.dumps(data, ensure_ascii=False) + "\n")
+
+    def write(self, department: Dict, product: Dict):
+        self.write_line({"department": department, "product": product})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.file.close()
+        if exc_type is None:
+            self.tmp_path.replace(self.path)
+        else:
+            self.tmp_path.unlink(missing_ok=True)
+
+
+def iter_snapshot(path: Path) -> Tuple[datetime, Iterator[Tuple[Dict, Dict]]]:
+    """The fetch time of a snapshot, and its (department, raw product) pairs."""
+    file = gzip.open(path, "rt", encoding="utf-8")
+    fetched_at = datetime.fromisoformat(json.loads(file.readline())["fetched_at"])
+
+    def records():
+        with file:
+            for line in file:
+                record = json.loads(line)
+                yield record["department"], record["product"]
+
+    return fetched_at, records()
+
+
+def list_snapshots(archive_dir: Path | None = None) -> List[Tuple[date, Path]]:
+    archive_dir = archive_dir or snapshot_archive_dir()
+    snapshots = [
+        (date.fromisoformat(path.name.removesuffix(SNAPSHOT_SUFFIX)), path)
+        for path in archive_dir.glob(f"*{SNAPSHOT_SUFFIX}")
+    ]
+    return sorted(snapshots)
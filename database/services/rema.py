@@ -1,14 +1,76 @@
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Optional
+from threading import Lock
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
+from database.services.archive import SnapshotWriter, iter_snapshot
 
 REMA_API_BASE_URL = "https://cphapp.rema1000.dk/api/v3"
 
+# HTTP client settings
+REQUEST_TIMEOUT = (5, 60)  # (connect, read) seconds
+MAX_RETRIES = 3
+RETRY_BACKOFF_FACTOR = 1
+MAX_WORKERS = 4
+MIN_REQUEST_INTERVAL = 0.25  # seconds between requests, across all workers
+PAGE_SIZE = 500  # products requested per page of a department
+UNPAGED_SIZE = 1000000000  # per_page asking for a whole department at once
+
+
+class RateLimiter:
+    """Spaces out calls so at most one request starts per `min_interval`."""
+
+    def __init__(self, min_interval: float) -> None:
+        self.min_interval = min_interval
+        self.next_request_at = 0.0
+        self.lock = Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            wait_for = self.next_request_at - now
+            self.next_request_at = max(now, self.next_request_at) + self.min_interval
+        if wait_for > 0:
+            time.sleep(wait_for)
+
+
+rate_limiter = RateLimiter(MIN_REQUEST_INTERVAL)
+_http_session: Optional[requests.Session] = None
+
+
+def get_http_session() -> requests.Session:
+    # A single pooled session keeps connections to Rema's API alive
+    global _http_session
+    if _http_session is None:
+        retry = Retry(
+            total=MAX_RETRIES,
+            backoff_factor=RETRY_BACKOFF_FACTOR,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET",),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS, max_retries=retry
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _http_session = session
+    return _http_session
+
 
 def safe_request(url: str) -> Optional[Dict]:
     try:
-        response: requests.Response = requests.get(url)
+        rate_limiter.wait()
+        response: requests.Response = get_http_session().get(
+            url, timeout=REQUEST_TIMEOUT
+        )
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -33,13 +95,15 @@ def clean_temperature_zone(temp_zone: Optional[str]) -> Optional[int]:
     return None
 
 
-def process_product(product: dict, department: dict):
+def process_product(
+    product: dict, department: dict, logged_on: Optional[datetime] = None
+):
     # Add department info
     product["department_name"] = department["name"]
     product["department_id"] = department["id"]
 
-    # Add price found date
-    product["logged_on"] = datetime.now().isoformat()
+    # Add price found date, which is in the past when replaying a snapshot
+    product["logged_on"] = (logged_on or datetime.now()).isoformat()
 
     # Only keep medium-size image
     try:
@@ -65,39 +129,167 @@ def process_product(product: dict, department: dict):
     return product
 
 
-def get_products(department):
-    products_url = f"{REMA_API_BASE_URL}/departments/{department['id']}/products?per_page=1000000000"
-    response = safe_request(products_url)
-    if not response:
-        return []
+def department_products_url(department, per_page: int, page: int = 1) -> str:
+    return (
+        f"{REMA_API_BASE_URL}/departments/{department['id']}/products"
+        f"?per_page={per_page}&page={page}"
+    )
+
+
+def iter_department_raw_products(department) -> Iterator[dict]:
+    # Page through the department instead of requesting it all in one response
+    page = 1
+    previous_first_id = None
+    seen_ids = set()
+    while True:
+        response = safe_request(department_products_url(department, PAGE_SIZE, page))
+        if not response:
+            # Ending here would silently drop the rest of the department
+            raise RuntimeError(
+                f"Could not fetch page {page} of department {department['id']}"
+            )
+        if not response["data"]:
+            return
+
+        page_products = response["data"]
+        if page_products[0]["id"] == previous_first_id:
+            # The API ignored the page parameter. Stopping here would silently
+            # drop the rest of the department, so fetch it in one response.
+            print(
+                f"Error: paging ignored for department {department['id']}, "
+                "fetching it unpaged"
+            )
+            response = safe_request(department_products_url(department, UNPAGED_SIZE))
+            if not response:
+                raise RuntimeError(
+                    f"Could not fetch department {department['id']} unpaged"
+                )
+            for product in response["data"]:
+                if product["id"] not in seen_ids:
+                    yield product
+            return
+        previous_first_id = page_products[0]["id"]
+
+        seen_ids.update(product["id"] for product in page_products)
+        yield from page_products
+
+        total_pages = response.get("meta", {}).get("pagination", {}).get("total_pages")
+        if len(page_products) < PAGE_SIZE or (total_pages and page >= total_pages):
+            return
+        page += 1
+
+
+def get_raw_products(department):
+    return list(iter_department_raw_products(department))
+
+
+def process_products(
+    raw_products: Iterable[dict],
+    department: dict,
+    archive: Optional[SnapshotWriter] = None,
+    logged_on: Optional[datetime] = None,
+) -> Iterator[dict]:
+    for product in raw_products:
+        # Archived before process_product changes it
+        if archive:
+            archive.write(department, product)
+        yield process_product(product, department, logged_on)
+
 
+def iter_department_products(department) -> Iterator[dict]:
+    return process_products(iter_department_raw_products(department), department)
+
+
+def get_products(department):
     # parse product elements from fetched data
-    products = []
-    for product in response["data"]:
-        product = process_product(product, department)
+    return list(iter_department_products(department))
 
-        products.append(product)
 
-    return products
+def iter_departments_raw_products(
+    max_workers=MAX_WORKERS,
+) -> Iterator[Tuple[dict, List[dict]]]:
+    """
+    Yields every department with its raw products, in department order.
+    At most `max_workers` departments are fetched and held in memory at a time.
+    """
+    print(f"Connecting to Rema's API...")
+    departments = get_departments()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for department in departments:
+            pending.append((department, executor.submit(get_raw_products, department)))
+            if len(pending) >= max_workers:
+                department, raw_products = pending.popleft()
+                yield department, raw_products.result()
+        while pending:
+            department, raw_products = pending.popleft()
+            yield department, raw_products.result()
+
+
+def iter_products(
+    max_workers=MAX_WORKERS, archive: Optional[SnapshotWriter] = None
+) -> Iterator[dict]:
+    """
+    Yields processed products from every department, in department order.
+    With `archive`, the raw products are also written to the snapshot archive.
+    """
+    for department, raw_products in iter_departments_raw_products(max_workers):
+        yield from process_products(raw_products, department, archive)
+
+
+def archive_products(archive: SnapshotWriter, max_workers=MAX_WORKERS) -> int:
+    """Fetches every department's raw products into `archive`, returning how many."""
+    count = 0
+    for department, raw_products in iter_departments_raw_products(max_workers):
+        for product in raw_products:
+            archive.write(department, product)
+        count += len(raw_products)
+    print(f"Archived {count} products")
+    return count
 
 
 def fetch(save_as_file=False):
     print(f"Connecting to Rema's API...")
     products = []
     departments = get_departments()
-    for department in departments:
-        department_products = get_products(department)
-        products.extend(department_products)
+    with start_archive(save_as_file) as archive:
+        for department in departments:
+            raw_products = get_raw_products(department)
+            products.extend(process_products(raw_products, department, archive))
+
+    return finish_fetch(products)
+
+
+def fetch_concurrent(save_as_file=False, max_workers=MAX_WORKERS):
+    """Same output as `fetch`, but fetches up to `max_workers` departments at once."""
+    with start_archive(save_as_file) as archive:
+        products = list(iter_products(max_workers, archive))
+
+    return finish_fetch(products)
 
-    if save_as_file:
-        with open(f"data_{datetime.now().date()}.json", "w") as json_file:
-            json.dump(products, json_file)
 
+def start_archive(save_as_file):
+    # Saved files go to the snapshot archive, which backfills can replay
+    return SnapshotWriter(datetime.now()) if save_as_file else nullcontext()
+
+
+def finish_fetch(products):
     print(f"Fetched {len(products)} products")
     return products
 
 
+def iter_snapshot_products(file_name) -> Iterator[dict]:
+    """Processed products from an archived snapshot, logged on the day it was fetched."""
+    fetched_at, records = iter_snapshot(file_name)
+    for department, product in records:
+        yield process_product(product, department, fetched_at)
+
+
 def fetch_from_file(file_name):
+    if str(file_name).endswith(".ndjson.gz"):
+        return list(iter_snapshot_products(file_name))
+
+    # Files saved before the snapshot archive hold processed products
     with open(file_name, "r") as json_file:
         return json.load(json_file)
 
@@ -1,36 +1,202 @@
-from typing import List
-from sqlalchemy import select
+from typing import Iterable, Iterator, List, Set, Tuple, TypeVar
+from sqlalchemy import Integer, and_, column, select, update, values
+from sqlalchemy.types import DateTime, Float
 from .models import Price, Product
 from sqlalchemy.orm import Session
 
+# Number of incoming rows checked against the database per query
+DEDUP_CHUNK_SIZE = 1000
+
+T = TypeVar("T")
+
+
+def chunked(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    chunk: List[T] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
 
 def remove_duplicates(
     objects: List[Price] | List[Product], session: Session
-) -> List[Product | Price | None]:
-    filtered_objects = []
-    for element in objects:
-        duplicate_element = is_duplicate(element, session=session)
-        if not duplicate_element:
-            filtered_objects.append(element)
-
-    return filtered_objects
-
-
-def is_duplicate(obj: Price | Product, session: Session):
-    if type(obj) is Price:
-        statement = select(Price).where(
-            Price.price == obj.price,
-            Price.starting_at == obj.starting_at,
-            Price.ending_at == obj.ending_at,
-            Price.product_id == obj.product_id,
+) -> List[Product | Price]:
+    if not objects:
+        return []
+    if type(objects[0]) is Product:
+        return remove_duplicate_products(objects, session)
+    return remove_duplicate_prices(objects, session)
+
+
+def remove_duplicate_products(
+    products: List[Product], session: Session
+) -> List[Product]:
+    filtered_products = []
+    seen_ids = set()
+    for chunk in chunked(products, DEDUP_CHUNK_SIZE):
+        # One keyed lookup per chunk instead of one SELECT per product
+        existing_ids = set(
+            session.scalars(
+                select(Product.id).where(Product.id.in_([p.id for p in chunk]))
+            )
+        )
+        for product in chunk:
+            # A product listed in several departments must only be inserted once
+            if product.id in existing_ids or product.id in seen_ids:
+                continue
+            seen_ids.add(product.id)
+            filtered_products.append(product)
+
+    return filtered_products
+
+
+def split_new_and_changed_products(
+    products: List[Product], session: Session, seen_ids: Set[int] | None = None
+) -> Tuple[List[Product], List[Product]]:
+    """
+    Splits incoming products into new products and existing products whose
+    content hash differs from the stored one. Unchanged products are dropped,
+    and so are products fetched before the stored ones were last seen, e.g.
+    from a backfill of archived days, so stored content is never rolled back.
+
+    Products whose id is in `seen_ids` are dropped too, and the ids of the rest
+    are added to it. Pass the same set for every batch of an ingest, so a
+    product listed in several departments is only handled the first time.
+    """
+    new_products = []
+    changed_products = []
+    if seen_ids is None:
+        seen_ids = set()
+    for chunk in chunked(products, DEDUP_CHUNK_SIZE):
+        existing = {
+            row.id: row
+            for row in session.execute(
+                select(Product.id, Product.content_hash, Product.last_seen).where(
+                    Product.id.in_([p.id for p in chunk])
+                )
+            )
+        }
+        for product in chunk:
+            if product.id in seen_ids:
+                continue
+            seen_ids.add(product.id)
+            stored = existing.get(product.id)
+            if stored is None:
+                new_products.append(product)
+            elif (
+                stored.content_hash != product.content_hash
+                and product.last_seen > stored.last_seen
+            ):
+                changed_products.append(product)
+
+    return new_products, changed_products
+
+
+def mark_products_seen(products: List[Product], session: Session):
+    """
+    Moves the stored `last_seen` of existing products forward to when the
+    incoming ones were fetched. Never moves it back, e.g. during a backfill.
+    """
+    for chunk in chunked(products, DEDUP_CHUNK_SIZE):
+        incoming = (
+            values(
+                column("id", Integer),
+                column("last_seen", DateTime),
+                name="incoming",
+            )
+            .data([(p.id, p.last_seen) for p in chunk])
+            .alias("incoming")
+        )
+        session.execute(
+            update(Product)
+            .where(
+                Product.id == incoming.c.id,
+                Product.last_seen < incoming.c.last_seen,
+            )
+            .values(last_seen=incoming.c.last_seen)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def update_changed_products(
+    changed_products: List[Product], session: Session
+) -> Set[int]:
+    """
+    Copies only the columns that actually differ onto the stored rows. Returns
+    the departments products moved out of or into, whose price metrics are
+    then out of date for every day.
+    """
+    moved_departments = set()
+    for chunk in chunked(changed_products, DEDUP_CHUNK_SIZE):
+        stored_products = {
+            product.id: product
+            for product in session.scalars(
+                select(Product).where(Product.id.in_([p.id for p in chunk]))
+            )
+        }
+        for incoming in chunk:
+            stored = stored_products[incoming.id]
+            if stored.department_id != incoming.department_id:
+                moved_departments.update((stored.department_id, incoming.department_id))
+            for field in Product.CONTENT_FIELDS:
+                value = getattr(incoming, field)
+                if getattr(stored, field) != value:
+                    setattr(stored, field, value)
+            stored.content_hash = incoming.content_hash
+            stored.updated = incoming.updated
+
+    return moved_departments
+
+
+def remove_duplicate_prices(prices: List[Price], session: Session) -> List[Price]:
+    filtered_prices = []
+    seen_keys = set()
+    for chunk in chunked(prices, DEDUP_CHUNK_SIZE):
+        # Send the chunk as a VALUES list and let the database match it against
+        # the natural key, so comparisons behave exactly like a per-row SELECT
+        incoming = (
+            values(
+                column("idx", Integer),
+                column("product_id", Integer),
+                column("price", Float),
+                column("starting_at", DateTime),
+                column("ending_at", DateTime),
+                name="incoming",
+            )
+            .data(
+                [
+                    (idx, p.product_id, p.price, p.starting_at, p.ending_at)
+                    for idx, p in enumerate(chunk)
+                ]
+            )
+            .alias("incoming")
+        )
+        statement = (
+            select(incoming.c.idx)
+            .join(
+                Price,
+                and_(
+                    Price.product_id == incoming.c.product_id,
+                    Price.price == incoming.c.price,
+                    Price.starting_at == incoming.c.starting_at,
+                    Price.ending_at == incoming.c.ending_at,
+                ),
+            )
+            .distinct()
         )
-    elif type(obj) is Product:
-        statement = select(Product).where(Product.id == obj.id)
-    else:
-        return
+        duplicate_idx = set(session.scalars(statement))
+        for idx, price in enumerate(chunk):
+            # A product listed in several departments brings its prices twice
+            key = (price.product_id, price.price, price.starting_at, price.ending_at)
+            if idx in duplicate_idx or key in seen_keys:
+                continue
+            seen_keys.add(key)
+            filtered_prices.append(price)
 
-    existing_obj: Price | Product | None = session.scalars(statement=statement).first()
-    return existing_obj
+    return filtered_prices
 
 
 def create_price_objects(product_data) -> list[Price]:
@@ -1,26 +1,69 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from routers.products import router as products_router
 from routers.prices import router as prices_router
 from routers.departments import router as departments_router
 from routers.discounts import router as discounts_router
+from routers.export import router as export_router
+from routers.http_cache import conditional_get
+from routers.ingest import ingest_schedule_enabled, ingest_scheduler
+from routers.ingest import router as ingest_router
+from routers.metrics import record_request_metrics
+from routers.metrics import router as metrics_router
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from database.operations import dispose_engines
 
-app = FastAPI()
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The database engine is created by the first request that needs it
+    scheduler = (
+        asyncio.create_task(ingest_scheduler()) if ingest_schedule_enabled() else None
+    )
+    yield
+    if scheduler:
+        scheduler.cancel()
+    await dispose_engines()
 
-app.include_router(products_router)
-app.include_router(prices_router)
-app.include_router(departments_router)
-app.include_router(discounts_router)
 
+def create_app() -> FastAPI:
+    """
+    Builds the app without touching the database. The schema is created or
+    upgraded separately, with `python -m database init`.
+    """
+    app = FastAPI(lifespan=lifespan)
 
-@app.get("/")
-def read_root():
-    return "Server is running."
+    # Added first so CORS headers are also set on 304 responses
+    app.middleware("http")(conditional_get)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+    # Added last so it times the other middleware too
+    app.middleware("http")(record_request_metrics)
+
+    app.include_router(products_router)
+    app.include_router(prices_router)
+    app.include_router(departments_router)
+    app.include_router(discounts_router)
+    app.include_router(export_router)
+    app.include_router(metrics_router)
+    app.include_router(ingest_router)
+
+    @app.get("/")
+    def read_root():
+        return "Server is running."
+
+    return app
+
+
+app = create_app()
@@ -0,0 +1,71 @@
+"""initial schema
+
+Matches the tables previously created by Base.metadata.create_all.
+Databases created that way should be stamped instead of upgraded:
+    alembic stamp 0001
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "products",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("updated", sa.DateTime(), nullable=False),
+        sa.Column("underline", sa.String(), nullable=False),
+        sa.Column("age_limit", sa.Integer(), nullable=True),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("info", sa.String(), nullable=False),
+        sa.Column("image", sa.String(), nullable=True),
+        sa.Column("temperature_zone", sa.Integer(), nullable=True),
+        sa.Column("is_self_scale_item", sa.Boolean(), nullable=False),
+        sa.Column("is_weight_item", sa.Boolean(), nullable=False),
+        sa.Column("is_available_in_all_stores", sa.Boolean(), nullable=False),
+        sa.Column("is_batch_item", sa.Boolean(), nullable=False),
+        sa.Column("department_name", sa.String(), nullable=False),
+        sa.Column("department_id", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "prices",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("logged_on", sa.DateTime(), nullable=False),
+        sa.Column("price_over_max_quantity", sa.Float(), nullable=True),
+        sa.Column("max_quantity", sa.Integer(), nullable=True),
+        sa.Column("is_advertised", sa.Boolean(), nullable=False),
+        sa.Column("is_campaign", sa.Boolean(), nullable=False),
+        sa.Column("starting_at", sa.DateTime(), nullable=False),
+        sa.Column("ending_at", sa.DateTime(), nullable=False),
+        sa.Column("deposit", sa.Float(), nullable=True),
+        sa.Column("compare_unit", sa.String(), nullable=False),
+        sa.Column("compare_unit_price", sa.Float(), nullable=False),
+        sa.Column("consumption_unit", sa.String(), nullable=True),
+        sa.Column("consumption_quantity", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["product_id"], ["products.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("prices")
+    op.drop_table("products")
@@ -0,0 +1,84 @@
+"""product content hash and deal snapshots
+
+Written to be safe on databases where create_all already added some of
+these objects.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 09:10:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("ALTER TABLE products ADD COLUMN IF NOT EXISTS content_hash VARCHAR")
+
+    existing_tables = sa.inspect(op.get_bind()).get_table_names()
+    if "deal_snapshots" not in existing_tables:
+        op.create_table(
+            "deal_snapshots",
+            sa.Column("product_id", sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column("product_name", sa.String(), nullable=False),
+            sa.Column("image", sa.String(), nullable=True),
+            sa.Column("department_name", sa.String(), nullable=False),
+            sa.Column("department_id", sa.Integer(), nullable=False),
+            sa.Column("advertised_price", sa.Float(), nullable=False),
+            sa.Column("regular_price", sa.Float(), nullable=False),
+            sa.Column("starting_at", sa.DateTime(), nullable=False),
+            sa.Column("ending_at", sa.DateTime(), nullable=False),
+            sa.Column("difference_amount", sa.Float(), nullable=False),
+            sa.Column("difference_percent", sa.Float(), nullable=True),
+            sa.PrimaryKeyConstraint("product_id"),
+        )
+        op.create_index(
+            "ix_deal_snapshots_department_id", "deal_snapshots", ["department_id"]
+        )
+        op.create_index(
+            "ix_deal_snapshots_difference_amount",
+            "deal_snapshots",
+            ["difference_amount"],
+        )
+        op.create_index(
+            "ix_deal_snapshots_difference_percent",
+            "deal_snapshots",
+            ["difference_percent"],
+        )
+    if "department_price_snapshots" not in existing_tables:
+        op.create_table(
+            "department_price_snapshots",
+            sa.Column(
+                "department_id", sa.Integer(), autoincrement=False, nullable=False
+            ),
+            sa.Column("department_name", sa.String(), nullable=False),
+            sa.Column("avg_price", sa.Float(), nullable=False),
+            sa.Column("min_price", sa.Float(), nullable=False),
+            sa.Column("max_price", sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint("department_id"),
+        )
+    if "snapshot_info" not in existing_tables:
+        op.create_table(
+            "snapshot_info",
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("built_at", sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint("name"),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("snapshot_info")
+    op.drop_table("department_price_snapshots")
+    op.drop_table("deal_snapshots")
+    op.drop_column("products", "content_hash")
@@ -0,0 +1,63 @@
+"""indexes for the hot query predicates
+
+- prices (product_id, starting_at, ending_at, price): price history of a
+  product and the natural key used to deduplicate prices during ingest
+- prices (is_advertised, starting_at, ending_at): prices valid today
+- products (department_id, name): department listings and the
+  department_id, name ordering of /product/
+- products (name): name ordering
+
+Indexes are built concurrently so the tables stay writable.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 09:20:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    (
+        "ix_prices_product_id_natural_key",
+        "prices",
+        ["product_id", "starting_at", "ending_at", "price"],
+    ),
+    (
+        "ix_prices_advertised_window",
+        "prices",
+        ["is_advertised", "starting_at", "ending_at"],
+    ),
+    ("ix_products_department_id_name", "products", ["department_id", "name"]),
+    ("ix_products_name", "products", ["name"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table, postgresql_concurrently=True, if_exists=True
+            )
@@ -0,0 +1,56 @@
+"""extend the product listing index with id
+
+Keyset pagination orders products by (department_id, name, id), so the
+index needs id as its last column to serve the cursor comparison.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 10:30:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_products_department_id_name_id",
+            "products",
+            ["department_id", "name", "id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_products_department_id_name",
+            table_name="products",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_products_department_id_name",
+            "products",
+            ["department_id", "name"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_products_department_id_name_id",
+            table_name="products",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
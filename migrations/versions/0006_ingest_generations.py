@@ -0,0 +1,37 @@
+"""ingest generations
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "ingest_generations",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=False),
+        sa.Column("committed_at", sa.DateTime(), nullable=False),
+        sa.Column("new_products", sa.Integer(), nullable=False),
+        sa.Column("new_prices", sa.Integer(), nullable=False),
+        sa.Column("updated_products", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("ingest_generations")
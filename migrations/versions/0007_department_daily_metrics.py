@@ -0,0 +1,80 @@
+"""department daily metrics rollup
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, Sequence[str], None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_prices_logged_on",
+            "prices",
+            ["logged_on"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+    op.create_table(
+        "department_daily_metrics",
+        sa.Column("department_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("department_name", sa.String(), nullable=False),
+        sa.Column("avg_price", sa.Float(), nullable=False),
+        sa.Column("median_price", sa.Float(), nullable=False),
+        sa.Column("min_price", sa.Float(), nullable=False),
+        sa.Column("max_price", sa.Float(), nullable=False),
+        sa.Column("price_volatility", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("department_id", "day"),
+    )
+    op.create_index(
+        "ix_department_daily_metrics_day", "department_daily_metrics", ["day"]
+    )
+
+    # Backfill the existing price history, later ingests only add their own days
+    op.execute("""
+        INSERT INTO department_daily_metrics (
+            department_id, day, department_name, avg_price, median_price,
+            min_price, max_price, price_volatility
+        )
+        SELECT
+            products.department_id,
+            date(prices.logged_on),
+            max(products.department_name),
+            avg(prices.price),
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY prices.price),
+            min(prices.price),
+            max(prices.price),
+            coalesce(stddev(prices.price), 0)
+        FROM prices JOIN products ON products.id = prices.product_id
+        GROUP BY products.department_id, date(prices.logged_on)
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_department_daily_metrics_day", table_name="department_daily_metrics"
+    )
+    op.drop_table("department_daily_metrics")
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_prices_logged_on",
+            table_name="prices",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
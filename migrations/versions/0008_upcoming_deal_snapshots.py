@@ -0,0 +1,55 @@
+"""upcoming deals in the deal snapshot
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, Sequence[str], None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("deal_snapshots", sa.Column("price_id", sa.Integer(), nullable=True))
+    # Keep serving the current snapshot until the next ingest rebuilds it
+    op.execute("""
+        UPDATE deal_snapshots SET price_id = (
+            SELECT prices.id FROM prices
+            WHERE prices.product_id = deal_snapshots.product_id
+                AND prices.is_advertised
+                AND prices.starting_at = deal_snapshots.starting_at
+                AND prices.ending_at = deal_snapshots.ending_at
+            ORDER BY prices.id
+            LIMIT 1
+        )
+        """)
+    op.execute("DELETE FROM deal_snapshots WHERE price_id IS NULL")
+    op.alter_column("deal_snapshots", "price_id", nullable=False)
+
+    op.drop_constraint("deal_snapshots_pkey", "deal_snapshots", type_="primary")
+    op.create_primary_key("deal_snapshots_pkey", "deal_snapshots", ["price_id"])
+    op.create_index("ix_deal_snapshots_product_id", "deal_snapshots", ["product_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_deal_snapshots_product_id", table_name="deal_snapshots")
+    op.drop_constraint("deal_snapshots_pkey", "deal_snapshots", type_="primary")
+    # Only one deal per product fits the old key
+    op.execute("""
+        DELETE FROM deal_snapshots a USING deal_snapshots b
+        WHERE a.product_id = b.product_id
+            AND (a.starting_at, a.price_id) > (b.starting_at, b.price_id)
+        """)
+    op.create_primary_key("deal_snapshots_pkey", "deal_snapshots", ["product_id"])
+    op.drop_column("deal_snapshots", "price_id")
@@ -0,0 +1,37 @@
+"""ingest generation kind
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 21:30:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, Sequence[str], None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "ingest_generations",
+        sa.Column("kind", sa.String(), server_default="ingest", nullable=False),
+    )
+    # Manual snapshot refreshes were recorded with no rows and no duration
+    op.execute("""
+        UPDATE ingest_generations SET kind = 'snapshot_refresh'
+        WHERE started_at = committed_at
+            AND new_products = 0 AND new_prices = 0 AND updated_products = 0
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("ingest_generations", "kind")
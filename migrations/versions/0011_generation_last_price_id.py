@@ -0,0 +1,31 @@
+"""price id watermark of the daily rollups
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 23:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0011"
+down_revision: Union[str, Sequence[str], None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Left empty on existing rows, so the next ingest recomputes every day once
+    op.add_column(
+        "ingest_generations", sa.Column("last_price_id", sa.Integer(), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("ingest_generations", "last_price_id")
@@ -0,0 +1,36 @@
+"""when each product was last fetched
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-17 23:30:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0012"
+down_revision: Union[str, Sequence[str], None] = "0011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("products", sa.Column("last_seen", sa.DateTime(), nullable=True))
+    # The latest of the last content change and the last new price
+    op.execute("""
+        UPDATE products SET last_seen = GREATEST(
+            updated,
+            (SELECT max(logged_on) FROM prices WHERE prices.product_id = products.id)
+        )
+        """)
+    op.alter_column("products", "last_seen", nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("products", "last_seen")
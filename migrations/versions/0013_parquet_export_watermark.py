@@ -0,0 +1,35 @@
+"""parquet export watermark in the database
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0013"
+down_revision: Union[str, Sequence[str], None] = "0012"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Filled from the export directory's _state.json on the next export
+    op.create_table(
+        "parquet_exports",
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("last_price_id", sa.Integer(), nullable=False),
+        sa.Column("exported_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("parquet_exports")
@@ -0,0 +1,177 @@
+"""
+Benchmarks the ingest and the routes on synthetic catalogues of several sizes,
+and saves the timings as JSON so runs before and after a change can be compared.
+
+For each scale the scratch database is rebuilt and the whole price history is
+ingested one day at a time, timing every `add_products` call. Every route is
+then called `--repeat` times with empty caches, so each call reaches the database.
+
+    PERF_DATABASE_URL=postgresql://localhost/rema_perf python -m perf.bench \\
+        --scales small medium --output before.json
+    PERF_DATABASE_URL=... python -m perf.bench --output after.json --compare before.json
+"""
+
+import argparse
+from datetime import datetime
+import json
+from pathlib import Path
+import statistics
+import subprocess
+import time
+from typing import Dict, List
+from perf.harness import reset_database, sample_route_values
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from database.operations import add_products, get_engine
+from main import app
+from perf.synthetic import generate_history
+from routers.cache import expire_generation, response_cache
+
+# Products, departments and days of price history
+SCALES = {
+    "small": (1_000, 10, 14),
+    "medium": (5_000, 25, 28),
+    "large": (20_000, 50, 56),
+}
+
+ROUTES = [
+    ("GET", "/product/?limit=100"),
+    ("GET", "/product/?limit=100&cursor={product_cursor}"),
+    ("GET", "/product/search/?query=kaffe"),
+    ("GET", "/product/search/?query=øko%20mæ"),
+    ("GET", "/product/{product_id}"),
+    ("POST", "/product/batch"),
+    ("GET", "/prices/{product_id}"),
+    ("GET", "/prices/{product_id}?start=2023-01-01"),
+    ("POST", "/prices/batch"),
+    ("GET", "/department/"),
+    ("GET", "/department/metrics"),
+    ("GET", "/department/{department_id}?limit=100"),
+    ("GET", "/department/{department_id}?limit=100&cursor={department_cursor}"),
+    ("GET", "/discount/"),
+    ("GET", "/discount/departments"),
+    ("GET", "/discount/departments/{department_id}"),
+    ("GET", "/discount/top-10-discounts"),
+    ("GET", "/discount/under-50-percent"),
+]
+
+
+def summarize(durations: List[float]) -> Dict[str, float]:
+    durations_ms = sorted(duration * 1000 for duration in durations)
+    return {
+        "min_ms": round(durations_ms[0], 2),
+        "median_ms": round(statistics.median(durations_ms), 2),
+        "p95_ms": round(durations_ms[int(0.95 * (len(durations_ms) - 1))], 2),
+        "max_ms": round(durations_ms[-1], 2),
+    }
+
+
+def bench_ingest(products: int, departments: int, days: int) -> Dict:
+    reset_database()
+    durations = []
+    for _, catalogue in generate_history(days, products, departments):
+        started = time.perf_counter()
+        add_products(catalogue)
+        durations.append(time.perf_counter() - started)
+
+    with get_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+
+    return {
+        "total_s": round(sum(durations), 2),
+        # The first day inserts the catalogue, later days mostly find duplicates
+        "first_day": summarize(durations[:1]),
+        "later_days": summarize(durations[1:] or durations),
+    }
+
+
+def bench_routes(client: TestClient, repeat: int) -> Dict[str, Dict]:
+    values = sample_route_values()
+    results = {}
+    for method, route in ROUTES:
+        body = {"product_ids": values["batch_ids"]} if method == "POST" else None
+        url = route.format(**values)
+        durations = []
+        for _ in range(repeat):
+            expire_generation()
+            response_cache.entries.clear()
+            started = time.perf_counter()
+            response = client.request(method, url, json=body)
+            durations.append(time.perf_counter() - started)
+            response.raise_for_status()
+        results[f"{method} {route}"] = summarize(durations)
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(results: Dict, previous: Dict):
+    print(f"\nMedian times against {previous.get('commit') or 'the previous run'}:")
+    for scale, scale_results in results["scales"].items():
+        previous_scale = previous["scales"].get(scale)
+        if previous_scale is None:
+            continue
+        timings = {
+            "add_products (later days)": (
+                scale_results["ingest"]["later_days"],
+                previous_scale["ingest"]["later_days"],
+            )
+        }
+        for route, timing in scale_results["routes"].items():
+            if route in previous_scale["routes"]:
+                timings[route] = (timing, previous_scale["routes"][route])
+
+        print(f"\n{scale}:")
+        for name, (timing, previous_timing) in timings.items():
+            before = previous_timing["median_ms"]
+            after = timing["median_ms"]
+            ratio = after / before if before else float("inf")
+            print(f"  {before:9.2f} -> {after:9.2f} ms  ({ratio:5.2f}x)  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scales", nargs="+", choices=SCALES, default=["small"])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", type=Path, default=Path("bench-results.json"))
+    parser.add_argument("--compare", type=Path, help="Earlier results to compare to")
+    args = parser.parse_args()
+
+    results = {
+        "commit": git_commit(),
+        "started_at": datetime.now().isoformat(),
+        "repeat": args.repeat,
+        "scales": {},
+    }
+    with TestClient(app) as client:
+        for scale in args.scales:
+            products, departments, days = SCALES[scale]
+            print(f"Benchmarking {scale}: {products} products, {days} days")
+            results["scales"][scale] = {
+                "products": products,
+                "departments": departments,
+                "days": days,
+                "ingest": bench_ingest(products, departments, days),
+                "routes": bench_routes(client, args.repeat),
+            }
+
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f"Results saved to {args.output}")
+
+    if args.compare:
+        print_comparison(results, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
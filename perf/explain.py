@@ -0,0 +1,118 @@
+"""
+Checks that the queries behind each route are served by indexes.
+
+Seeds the scratch database, calls every route and runs EXPLAIN on each SELECT
+it issues with sequential scans, hash joins and merge joins disabled, so the
+planner has to use an index wherever one can serve the query. A hot table is
+read in full when the plan still has a Seq Scan on it, or walks a whole index
+without an index condition outside of a LIMIT. Exits with status 1 if a route
+reads a hot table in full without being allowed to.
+
+    PERF_DATABASE_URL=postgresql://localhost/rema_perf python -m perf.explain
+"""
+
+import json
+import sys
+from typing import Dict, List, Set
+from perf.harness import sample_route_values, seed_database
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from database.operations import get_async_engine
+from main import app
+
+HOT_TABLES = {"products", "prices"}
+PLANNER_SETTINGS = ("enable_seqscan", "enable_hashjoin", "enable_mergejoin")
+
+# Route, and the hot tables it reads in full by design
+CHECKS = [
+    ("/product/?limit=50", set()),
+    ("/product/?limit=50&cursor={product_cursor}", set()),
+    ("/product/search/?query=kaffe", set()),
+    ("/product/search/?query=kaf%20hel", set()),
+    # Counts every product
+    ("/product/count", {"products"}),
+    ("/product/{product_id}", set()),
+    ("/prices/{product_id}", set()),
+    ("/prices/{product_id}?start=2024-01-01", set()),
+    # Distinct departments over every product
+    ("/department/", {"products"}),
+    ("/department/metrics", set()),
+    ("/department/metrics?start=2024-01-01&end=2024-02-01", set()),
+    ("/department/{department_id}/count", set()),
+    ("/department/{department_id}?limit=50", set()),
+    ("/department/{department_id}?limit=50&cursor={department_cursor}", set()),
+    ("/discount/", set()),
+    ("/discount/departments", set()),
+    ("/discount/departments/{department_id}", set()),
+    ("/discount/top-10-discounts", set()),
+    ("/discount/under-50-percent", set()),
+]
+
+full_scans: List[Dict] = []
+
+
+def find_full_scans(plan: Dict, limited: bool = False) -> Set[str]:
+    tables = set()
+    node_type = plan["Node Type"]
+    if node_type == "Seq Scan":
+        tables.add(plan["Relation Name"])
+    elif node_type in ("Index Scan", "Index Only Scan"):
+        if "Index Cond" not in plan and (not limited or "Filter" in plan):
+            tables.add(plan["Relation Name"])
+    elif node_type == "Bitmap Heap Scan" and "Recheck Cond" not in plan:
+        tables.add(plan["Relation Name"])
+
+    # An unfiltered index walk directly under a LIMIT stops early
+    for child in plan.get("Plans", []):
+        tables |= find_full_scans(child, limited=node_type == "Limit")
+    return tables
+
+
+def explain_statement(conn, cursor, statement, parameters, context, executemany):
+    if executemany or not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return
+
+    for setting in PLANNER_SETTINGS:
+        cursor.execute(f"SET {setting} = off")
+    cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+    plan = cursor.fetchall()[0][0]
+    for setting in PLANNER_SETTINGS:
+        cursor.execute(f"RESET {setting}")
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    tables = find_full_scans(plan[0]["Plan"])
+    if tables:
+        full_scans.append({"tables": tables, "statement": statement})
+
+
+def main():
+    seed_database()
+    ids = sample_route_values()
+
+    failed = False
+    event.listen(
+        get_async_engine().sync_engine, "before_cursor_execute", explain_statement
+    )
+    with TestClient(app) as client:
+        for route, allowed_full_scans in CHECKS:
+            full_scans.clear()
+            response = client.get(route.format(**ids))
+            response.raise_for_status()
+
+            violations = [
+                scan
+                for scan in full_scans
+                if (scan["tables"] & HOT_TABLES) - allowed_full_scans
+            ]
+            print(f"{'FAIL' if violations else 'ok':4}  {route}")
+            for scan in violations:
+                failed = True
+                print(f"      Full scan of {', '.join(sorted(scan['tables']))}:")
+                print(f"      {' '.join(scan['statement'].split())[:200]}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
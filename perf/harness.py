@@ -0,0 +1,70 @@
+"""
+Shared setup for the checks in this package, which run against a scratch
+database. PERF_DATABASE_URL must point to a database that may be wiped; it
+replaces DATABASE_URL for everything imported after this module.
+"""
+
+from contextlib import contextmanager
+import os
+from typing import Dict, List
+
+PERF_DATABASE_URL = os.getenv("PERF_DATABASE_URL")
+if not PERF_DATABASE_URL:
+    raise SystemExit("Set PERF_DATABASE_URL to a scratch database; it will be wiped.")
+os.environ["DATABASE_URL"] = PERF_DATABASE_URL
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+from sqlalchemy import Engine, event, select, text
+from database.models import Base, Product
+from database.operations import add_products, db_session, get_engine
+from database.schema import upgrade_schema
+from perf.synthetic import generate_history
+from routers.utils import encode_cursor
+
+
+def reset_database():
+    """Drops every table and rebuilds the schema through the migrations."""
+    Base.metadata.drop_all(get_engine())
+    with get_engine().begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS alembic_version"))
+    upgrade_schema()
+
+
+def seed_database(days=14, products=500, departments=10, seed=0):
+    reset_database()
+    for _, catalogue in generate_history(days, products, departments, seed):
+        add_products(catalogue)
+    with get_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def sample_route_values() -> Dict:
+    """Ids and cursors from the seeded data, to fill in route templates."""
+    with db_session() as session:
+        product = session.scalars(select(Product).order_by(Product.id).limit(1)).one()
+        product_ids = session.scalars(select(Product.id).order_by(Product.id)).all()
+    return {
+        "product_id": product.id,
+        "department_id": product.department_id,
+        "product_cursor": encode_cursor(
+            product.department_id, product.name, product.id
+        ),
+        "department_cursor": encode_cursor(product.name, product.id),
+        # A tenth of the catalogue, so batch requests grow with it
+        "batch_ids": product_ids[: max(len(product_ids) // 10, 1)],
+    }
+
+
+@contextmanager
+def record_statements(target: Engine):
+    """Collects the SQL of every statement sent through `target`."""
+    statements: List[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        statements.append(statement)
+
+    event.listen(target, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(target, "before_cursor_execute", before_cursor_execute)
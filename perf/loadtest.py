@@ -0,0 +1,225 @@
+"""
+Load test for the API against the seeded scratch database.
+
+Starts uvicorn with one worker (or targets `--url`), then drives a weighted mix
+of routes, either with a fixed number of concurrent clients or at a fixed
+request rate. Each concurrency or rate given is run as its own step, so the
+step where throughput stops growing and latency climbs is where the server
+saturates. Reports throughput, error rate and p50/p95/p99 latency per route.
+
+    PERF_DATABASE_URL=postgresql://localhost/rema_perf python -m perf.loadtest \\
+        --seed --mix catalogue --concurrency 1 4 16 64 --duration 20
+    PERF_DATABASE_URL=... python -m perf.loadtest --mix metrics --rate 50 100 200
+
+With `--rate`, latency is measured from when each request was due, so a server
+that falls behind shows it in the percentiles.
+"""
+
+import argparse
+import asyncio
+from collections import defaultdict
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+from perf.harness import PERF_DATABASE_URL, sample_route_values, seed_database
+import httpx
+
+# Weight, method and route
+MIXES: Dict[str, List[Tuple[int, str, str]]] = {
+    "catalogue": [
+        (30, "GET", "/product/?limit=100"),
+        (10, "GET", "/product/?limit=100&cursor={product_cursor}"),
+        (20, "GET", "/product/search/?query=kaffe"),
+        (20, "GET", "/product/{product_id}"),
+        (20, "GET", "/prices/{product_id}"),
+    ],
+    "deals": [
+        (40, "GET", "/discount/top-10-discounts"),
+        (20, "GET", "/discount/departments"),
+        (20, "GET", "/discount/departments/{department_id}"),
+        (10, "GET", "/discount/under-50-percent"),
+        (10, "GET", "/discount/"),
+    ],
+    "metrics": [
+        (50, "GET", "/department/metrics"),
+        (50, "GET", "/discount/departments"),
+    ],
+    "mixed": [
+        (20, "GET", "/product/?limit=100"),
+        (15, "GET", "/product/search/?query=kaffe"),
+        (15, "GET", "/product/{product_id}"),
+        (15, "GET", "/prices/{product_id}"),
+        (5, "POST", "/prices/batch"),
+        (10, "GET", "/discount/top-10-discounts"),
+        (10, "GET", "/discount/departments"),
+        (5, "GET", "/department/metrics"),
+        (5, "GET", "/department/{department_id}?limit=100"),
+    ],
+}
+
+
+class Results:
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, route: str, latency: float, ok: bool):
+        self.latencies[route].append(latency)
+        if not ok:
+            self.errors[route] += 1
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    return sorted_values[
+        min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    ]
+
+
+def pick_requests(mix: str, values: Dict, rng: random.Random):
+    routes = MIXES[mix]
+    weights = [weight for weight, _, _ in routes]
+    body = {"product_ids": values["batch_ids"]}
+    while True:
+        _, method, route = rng.choices(routes, weights)[0]
+        yield route, method, route.format(**values), body if method == "POST" else None
+
+
+async def send(client: httpx.AsyncClient, results: Results, request, due: float):
+    route, method, url, body = request
+    try:
+        response = await client.request(method, url, json=body)
+        ok = response.status_code < 400
+    except httpx.HTTPError:
+        ok = False
+    results.record(route, time.perf_counter() - due, ok)
+
+
+async def run_concurrency(client, requests, concurrency: int, duration: float):
+    results = Results()
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            await send(client, results, next(requests), time.perf_counter())
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results
+
+
+async def run_rate(client, requests, rate: float, duration: float):
+    results = Results()
+    started = time.perf_counter()
+    tasks = []
+    for index in range(int(rate * duration)):
+        due = started + index / rate
+        await asyncio.sleep(max(due - time.perf_counter(), 0))
+        tasks.append(asyncio.create_task(send(client, results, next(requests), due)))
+    await asyncio.gather(*tasks)
+    return results
+
+
+def print_report(label: str, results: Results, elapsed: float):
+    total = sum(len(latencies) for latencies in results.latencies.values())
+    errors = sum(results.errors.values())
+    print(
+        f"\n{label}: {total / elapsed:.1f} req/s, "
+        f"{errors / max(total, 1):.1%} errors, {total} requests in {elapsed:.1f} s"
+    )
+    print(
+        f"  {'req/s':>7} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  route"
+    )
+    rows = sorted(
+        results.latencies.items(), key=lambda item: -percentile(sorted(item[1]), 0.99)
+    )
+    for route, latencies in rows:
+        latencies_ms = sorted(latency * 1000 for latency in latencies)
+        print(
+            f"  {len(latencies) / elapsed:7.1f} "
+            f"{results.errors[route] / len(latencies):7.1%} "
+            f"{percentile(latencies_ms, 0.5):8.1f} "
+            f"{percentile(latencies_ms, 0.95):8.1f} "
+            f"{percentile(latencies_ms, 0.99):8.1f}  {route}"
+        )
+
+
+def start_server(port: int, workers: int, uncached: bool) -> subprocess.Popen:
+    env = {**os.environ, "DATABASE_URL": PERF_DATABASE_URL}
+    if uncached:
+        env["CACHE_MAX_ENTRIES"] = "0"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)]
+        + ["--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(url, timeout=1)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.terminate()
+    raise SystemExit("uvicorn did not start")
+
+
+async def run(args, url: str):
+    values = sample_route_values()
+    requests = pick_requests(args.mix, values, random.Random(0))
+    steps = [("concurrency", level) for level in args.concurrency or []]
+    steps += [("rate", level) for level in args.rate or []]
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        # One pass over the mix, so first-request costs don't count
+        for _ in range(len(MIXES[args.mix]) * 2):
+            route, method, path, body = next(requests)
+            await client.request(method, path, json=body)
+
+        for kind, level in steps:
+            started = time.perf_counter()
+            if kind == "concurrency":
+                results = await run_concurrency(
+                    client, requests, int(level), args.duration
+                )
+                label = f"{args.mix} at concurrency {int(level)}"
+            else:
+                results = await run_rate(client, requests, level, args.duration)
+                label = f"{args.mix} at {level:g} req/s"
+            print_report(label, results, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mix", choices=MIXES, default="mixed")
+    parser.add_argument("--concurrency", type=int, nargs="+")
+    parser.add_argument("--rate", type=float, nargs="+", help="Requests per second")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per step")
+    parser.add_argument("--seed", action="store_true", help="Seed the database first")
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--url", help="Target a running server instead")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--uncached", action="store_true", help="Disable the server's response cache"
+    )
+    args = parser.parse_args()
+    if not args.concurrency and not args.rate:
+        args.concurrency = [1, 4, 16, 64]
+
+    if args.seed:
+        seed_database(products=args.products)
+
+    server = None if args.url else start_server(args.port, args.workers, args.uncached)
+    try:
+        asyncio.run(run(args, args.url or f"http://127.0.0.1:{args.port}"))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Checks how many SQL statements each route and the ingest issue.
+
+Seeds the scratch database at two catalogue sizes, ingests one more week of
+prices, and calls every route with empty caches. A check fails when it issues
+more statements than its budget, or more at the larger size than at the
+smaller one, which means it queries per row (N+1). Exits with status 1 if any
+check fails.
+
+    PERF_DATABASE_URL=postgresql://localhost/rema_perf python -m perf.query_budget
+"""
+
+from datetime import datetime, timedelta
+import sys
+from typing import Dict, List, Tuple
+from perf.harness import record_statements, sample_route_values, seed_database
+from fastapi.testclient import TestClient
+from database.operations import add_products, get_async_engine, get_engine
+from main import app
+from perf.synthetic import generate_history
+from routers.cache import expire_generation, response_cache
+
+# Kept below one page of batched inserts (1000 rows), so a bulk insert is
+# one statement at both sizes
+CATALOGUE_SIZES = (150, 600)
+DEPARTMENTS = 10
+SEED_DAYS = 3
+
+# Statements for one ingest of the whole catalogue in a single batch: the
+# duplicate checks, the writes, marking the products seen, finding the oldest
+# price not rolled up yet, and refreshing the rollup and snapshots
+INGEST_BUDGET = 16
+
+# Method, route, and the statements it may issue with empty caches. Routes
+# under CONDITIONAL_PREFIXES also read the ingest generation once.
+ROUTE_BUDGETS: List[Tuple[str, str, int]] = [
+    ("GET", "/product/?limit=500", 2),
+    ("GET", "/product/?limit=500&cursor={product_cursor}", 2),
+    ("GET", "/product/search/?query=kaffe&limit=100", 2),
+    ("GET", "/product/count", 2),
+    ("GET", "/product/{product_id}", 2),
+    ("POST", "/product/batch", 1),
+    ("GET", "/prices/{product_id}", 2),
+    ("POST", "/prices/batch", 1),
+    ("GET", "/department/", 2),
+    ("GET", "/department/metrics", 2),
+    ("GET", "/department/{department_id}/count", 2),
+    ("GET", "/department/{department_id}?limit=500", 2),
+    ("GET", "/department/{department_id}?cursor={department_cursor}", 2),
+    ("GET", "/discount/", 2),
+    ("GET", "/discount/departments", 3),
+    ("GET", "/discount/departments/{department_id}", 2),
+    ("GET", "/discount/top-10-discounts", 2),
+    ("GET", "/discount/under-50-percent", 2),
+    ("GET", "/discount/snapshot", 3),
+    ("GET", "/export/products", 2),
+    ("GET", "/export/prices", 2),
+    ("GET", "/metrics", 1),
+]
+
+
+def count_ingest_statements(products: int) -> int:
+    # A week after the seeded history, so every product gets new prices
+    last_day = datetime.now() + timedelta(days=7)
+    ((_, catalogue),) = generate_history(1, products, DEPARTMENTS, last_day=last_day)
+    with record_statements(get_engine()) as statements:
+        add_products(list(catalogue), batch_size=products)
+    return len(statements)
+
+
+def count_route_statements(client: TestClient) -> Dict[str, int]:
+    values = sample_route_values()
+    counts = {}
+    for method, route, _ in ROUTE_BUDGETS:
+        # Measure the worst case, with nothing cached
+        expire_generation()
+        response_cache.entries.clear()
+
+        body = {"product_ids": values["batch_ids"]} if method == "POST" else None
+        with record_statements(get_async_engine().sync_engine) as statements:
+            response = client.request(method, route.format(**values), json=body)
+        response.raise_for_status()
+        counts[route] = len(statements)
+    return counts
+
+
+def main():
+    ingest_counts = []
+    route_counts = []
+    with TestClient(app) as client:
+        for products in CATALOGUE_SIZES:
+            seed_database(days=SEED_DAYS, products=products, departments=DEPARTMENTS)
+            ingest_counts.append(count_ingest_statements(products))
+            route_counts.append(count_route_statements(client))
+
+    checks = [("add_products", INGEST_BUDGET, ingest_counts)]
+    checks += [
+        (f"{method} {route}", budget, [counts[route] for counts in route_counts])
+        for method, route, budget in ROUTE_BUDGETS
+    ]
+
+    failed = False
+    sizes = " -> ".join(str(products) for products in CATALOGUE_SIZES)
+    print(f"Statements per check, with {sizes} products:")
+    for name, budget, counts in checks:
+        problems = []
+        if max(counts) > budget:
+            problems.append(f"over budget of {budget}")
+        if counts[-1] > counts[0]:
+            problems.append("grows with the data (N+1)")
+        failed = failed or bool(problems)
+
+        counts_text = " -> ".join(str(count) for count in counts)
+        print(f"{'FAIL' if problems else 'ok':4}  {counts_text:>8}  {name}")
+        for problem in problems:
+            print(f"      {problem}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Measures how long a new uvicorn worker takes to serve its first requests:
+until `/` answers, and until the first route that reads the database does,
+which includes creating the engine and opening its first connection.
+
+    PERF_DATABASE_URL=postgresql://localhost/rema_perf python -m perf.startup --runs 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from perf.harness import PERF_DATABASE_URL
+import httpx
+
+FIRST_QUERY_ROUTE = "/product/count"
+
+
+def wait_for(client: httpx.Client, url: str, deadline: float) -> float:
+    while time.perf_counter() < deadline:
+        try:
+            if client.get(url).status_code == 200:
+                return time.perf_counter()
+        except httpx.TransportError:
+            pass
+        time.sleep(0.005)
+    raise SystemExit(f"No answer from {url}")
+
+
+def measure_startup(client: httpx.Client, port: int):
+    env = {**os.environ, "DATABASE_URL": PERF_DATABASE_URL}
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)]
+        + ["--log-level", "warning"],
+        env=env,
+    )
+    try:
+        url = f"http://127.0.0.1:{port}"
+        ready = wait_for(client, url, started + 30)
+        first_query = wait_for(client, url + FIRST_QUERY_ROUTE, started + 30)
+    finally:
+        server.terminate()
+        server.wait()
+    return ready - started, first_query - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    # Shared, so creating clients doesn't add to the measured time
+    with httpx.Client(timeout=1) as client:
+        timings = [measure_startup(client, args.port) for _ in range(args.runs)]
+    ready = statistics.median(timing[0] for timing in timings)
+    first_query = statistics.median(timing[1] for timing in timings)
+    print(f"Median over {args.runs} runs:")
+    print(f"  {ready * 1000:7.0f} ms  until / answers")
+    print(f"  {first_query * 1000:7.0f} ms  until {FIRST_QUERY_ROUTE} answers")
+
+
+if __name__ == "__main__":
+    main()
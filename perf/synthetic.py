@@ -0,0 +1,157 @@
+"""
+Synthetic Rema catalogues, in the same dict shape as the products returned by
+`database.services.rema.process_product`, for seeding scratch databases.
+"""
+
+from datetime import datetime, timedelta
+import random
+from typing import Iterator, List, Tuple
+
+WORDS = [
+    "øko",
+    "hel",
+    "mælk",
+    "rugbrød",
+    "smør",
+    "ost",
+    "kaffe",
+    "pasta",
+    "tomat",
+    "æble",
+    "banan",
+    "kylling",
+    "laks",
+    "yoghurt",
+    "juice",
+    "chips",
+    "chokolade",
+    "havregryn",
+    "ris",
+    "løg",
+]
+COMPARE_UNITS = ["kg", "l", "stk"]
+
+
+def department_for(product_id: int, department_count: int) -> dict:
+    department_id = product_id % department_count + 1
+    return {"id": department_id, "name": f"Afdeling {department_id}"}
+
+
+def generate_product(
+    product_id: int, department_count: int, day: datetime, seed: int = 0
+) -> dict:
+    """One product as it would look on `day`, including the prices valid that day."""
+    rng = random.Random(f"{seed}-{product_id}")
+    department = department_for(product_id, department_count)
+    base_price = round(rng.uniform(5, 150), 2)
+
+    week_start = datetime.combine(
+        (day - timedelta(days=day.weekday())).date(), datetime.min.time()
+    )
+    week_rng = random.Random(f"{seed}-{product_id}-{week_start.date()}")
+    # Each description changes every half year, staggered across products,
+    # so re-ingesting exercises product updates
+    revision = (week_start.toordinal() // 7 + product_id) // 26
+
+    name = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))).capitalize()
+    return {
+        "id": product_id,
+        "name": f"{name} {product_id}",
+        "underline": f"{rng.randint(1, 20) * 50} g / {department['name']}",
+        "age_limit": 18 if rng.random() < 0.02 else None,
+        "description": f"Beskrivelse af {name.lower()} (rev. {revision})",
+        "info": "",
+        "image": f"https://example.com/images/{product_id}.jpg",
+        "temperature_zone": rng.choice([None, 1, 2, 3]),
+        "is_self_scale_item": False,
+        "is_weight_item": rng.random() < 0.1,
+        "is_available_in_all_stores": rng.random() < 0.9,
+        "is_batch_item": False,
+        "department_name": department["name"],
+        "department_id": department["id"],
+        "logged_on": day.isoformat(),
+        "prices": generate_prices(base_price, week_start, week_rng),
+    }
+
+
+def generate_prices(
+    base_price: float, week_start: datetime, rng: random.Random
+) -> List[dict]:
+    """
+    A regular price for the whole week, and for some products an advertised
+    price for part of the week that overlaps it, sometimes as a campaign.
+    """
+    compare_unit = rng.choice(COMPARE_UNITS)
+    regular_price = round(base_price * rng.uniform(0.95, 1.05), 2)
+    prices = [
+        price_data(
+            regular_price,
+            week_start,
+            week_start + timedelta(days=7) - timedelta(seconds=1),
+            compare_unit,
+        )
+    ]
+
+    if rng.random() < 0.15:
+        starting_at = week_start + timedelta(days=rng.randint(0, 3))
+        ending_at = starting_at + timedelta(days=rng.randint(1, 4), hours=23)
+        advertised_price = round(regular_price * rng.uniform(0.4, 0.9), 2)
+        prices.append(
+            price_data(
+                advertised_price,
+                starting_at,
+                ending_at,
+                compare_unit,
+                is_advertised=True,
+                is_campaign=rng.random() < 0.3,
+            )
+        )
+
+    return prices
+
+
+def price_data(
+    price: float,
+    starting_at: datetime,
+    ending_at: datetime,
+    compare_unit: str,
+    is_advertised: bool = False,
+    is_campaign: bool = False,
+) -> dict:
+    return {
+        "price": price,
+        "price_over_max_quantity": None,
+        "max_quantity": None,
+        "is_advertised": is_advertised,
+        "is_campaign": is_campaign,
+        "starting_at": starting_at.isoformat(),
+        "ending_at": ending_at.isoformat(),
+        "deposit": None,
+        "compare_unit": compare_unit,
+        "compare_unit_price": round(price * 2, 2),
+        "consumption_unit": None,
+        "consumption_quantity": None,
+    }
+
+
+def generate_history(
+    days: int,
+    product_count: int,
+    department_count: int,
+    seed: int = 0,
+    last_day: datetime | None = None,
+) -> Iterator[Tuple[datetime, Iterator[dict]]]:
+    """
+    Yields (day, products) for `days` consecutive days ending on `last_day`,
+    as if the daily ingest had run on each of them.
+    """
+    last_day = last_day or datetime.now().replace(
+        hour=6, minute=0, second=0, microsecond=0
+    )
+    for offset in range(days - 1, -1, -1):
+        day = last_day - timedelta(days=offset)
+        products = (
+            generate_product(product_id, department_count, day, seed)
+            for product_id in range(1, product_count + 1)
+        )
+        yield day, products
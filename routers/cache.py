@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from datetime import date, datetime
+import functools
+import time
+from typing import Any, Hashable, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.env import getenv
+from database.models import IngestGeneration
+from database.operations import async_db_session
+
+_generation: Tuple[int, datetime | None] = (0, None)
+_generation_checked_at = float("-inf")
+
+
+async def current_generation() -> Tuple[int, datetime | None]:
+    """
+    The id and commit time of the latest ingest generation, re-read from the
+    database at most every CACHE_GENERATION_CHECK_INTERVAL seconds.
+    """
+    global _generation, _generation_checked_at
+    check_interval = float(getenv("CACHE_GENERATION_CHECK_INTERVAL", "30"))
+    if time.monotonic() - _generation_checked_at >= check_interval:
+        async with async_db_session() as session:
+            latest = (
+                await session.execute(
+                    select(IngestGeneration.id, IngestGeneration.committed_at)
+                    .order_by(IngestGeneration.id.desc())
+                    .limit(1)
+                )
+            ).first()
+        _generation = (latest.id, latest.committed_at) if latest else (0, None)
+        _generation_checked_at = time.monotonic()
+    return _generation
+
+
+def expire_generation():
+    """Makes the next request re-read the generation, e.g. after a manual refresh."""
+    global _generation_checked_at
+    _generation_checked_at = float("-inf")
+
+
+class ResponseCache:
+    """
+    LRU cache of endpoint results for one data generation. Results also depend
+    on today's date, so the cache is emptied when either changes.
+    """
+
+    def __init__(self, max_entries: int | None = None) -> None:
+        # CACHE_MAX_ENTRIES when not given, read on first use
+        self.max_entries = max_entries
+        self.entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self.version: Hashable = None
+
+    def set_version(self, version: Hashable):
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    def get(self, key: Hashable, default=None):
+        if key not in self.entries:
+            return default
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def set(self, key: Hashable, value: Any):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if self.max_entries is None:
+            self.max_entries = int(getenv("CACHE_MAX_ENTRIES", "512"))
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+response_cache = ResponseCache()
+_missing = object()
+
+
+def cached(endpoint):
+    """
+    Caches an endpoint's result by route and parameters until the next ingest.
+    The database session the endpoint receives is only used on a cache miss.
+    """
+
+    @functools.wraps(endpoint)
+    async def wrapper(**kwargs):
+        generation_id, _ = await current_generation()
+        version = (generation_id, date.today())
+        response_cache.set_version(version)
+
+        params = tuple(
+            sorted(
+                (name, value)
+                for name, value in kwargs.items()
+                if not isinstance(value, AsyncSession)
+            )
+        )
+        key = (endpoint.__module__, endpoint.__qualname__, params)
+        result = response_cache.get(key, _missing)
+        if result is _missing:
+            result = await endpoint(**kwargs)
+            # Don't store a result computed while a newer generation arrived
+            if response_cache.version == version:
+                response_cache.set(key, result)
+        return result
+
+    return wrapper
@@ -1,61 +1,72 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import func, select
-from sqlalchemy.orm import Session
-from database.models import Price, Product
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import DepartmentDailyMetrics, Product
 from database.operations import get_db
-from routers.models import DepartmentPriceMetricsResponse, PriceMetricsOnDate
-
+from routers.cache import cached
+from routers.models import (
+    Department,
+    DepartmentPriceMetricsResponse,
+    Page,
+    PriceMetricsOnDate,
+    ProductResponse,
+)
+from routers.utils import (
+    MAX_PAGE_SIZE,
+    PAGE_SIZE,
+    make_page,
+    select_page,
+    validate_date,
+)
 
 route_prefix = "/department"
 router = APIRouter(prefix=route_prefix)
 
 
-@router.get("/")
-async def get_all_departments(session: Session = Depends(get_db)):
-    departments = (
-        session.query(Product.department_name, Product.department_id).distinct().all()
-    )
+@router.get("/", response_model=List[Department])
+@cached
+async def get_all_departments(session: AsyncSession = Depends(get_db)):
+    query = select(Product.department_name, Product.department_id).distinct()
+    departments = (await session.execute(query)).all()
     return [
-        {"name": dept.department_name, "id": dept.department_id} for dept in departments
+        Department(name=dept.department_name, id=dept.department_id)
+        for dept in departments
     ]
 
 
-@router.get("/metrics")
-async def get_price_metrics(db: Session = Depends(get_db)):
+@router.get("/metrics", response_model=List[DepartmentPriceMetricsResponse])
+@cached
+async def get_price_metrics(
+    start: str | None = None,
+    end: str | None = None,
+    db: AsyncSession = Depends(get_db),
+):
     """
-    Returns the median price, price range, and price volatility for each department over time.
+    Returns the average and median price, price range, and price volatility for
+    each department per day, optionally from start up to, but not including, end.
     """
-
-    # Create query for median price, price range, and price volatility
-    query = (
-        select(
-            Product.department_id,
-            Product.department_name,
-            func.date(Price.logged_on).label("date"),
-            func.avg(Price.price).label("median_price"),
-            func.min(Price.price).label("min_price"),
-            func.max(Price.price).label("max_price"),
-            func.coalesce(func.stddev(Price.price), 0).label("price_volatility"),
-        )
-        .join(Product, Product.id == Price.product_id)
-        .group_by(
-            Product.department_id, Product.department_name, func.date(Price.logged_on)
-        )
+    query = select(DepartmentDailyMetrics).order_by(
+        DepartmentDailyMetrics.department_id, DepartmentDailyMetrics.day
     )
+    if start:
+        query = query.where(DepartmentDailyMetrics.day >= validate_date(start).date())
+    if end:
+        query = query.where(DepartmentDailyMetrics.day < validate_date(end).date())
 
-    # Execute the query and group the results
-    results = db.execute(query).fetchall()
+    # Read from the rollup, which each ingest updates for the days it touched
+    results = (await db.execute(query)).scalars().all()
 
     # Organize data into a structured format
     departments_metrics = {}
 
     for row in results:
         department_id = row.department_id
-        department_name = row.department_name
-        date_str = row.date.strftime("%Y-%m-%d")
+        date_str = row.day.strftime("%Y-%m-%d")
 
         # Create the PriceMetricsOnDate object
         price_metrics = PriceMetricsOnDate(
+            avg_price=row.avg_price,
             median_price=row.median_price,
             min_price=row.min_price,
             max_price=row.max_price,
@@ -66,39 +77,47 @@ async def get_price_metrics(db: Session = Depends(get_db)):
         if department_id not in departments_metrics:
             departments_metrics[department_id] = DepartmentPriceMetricsResponse(
                 department_id=department_id,
-                department_name=department_name,
+                department_name=row.department_name,
                 price_on_date={},
             )
 
         # Add the price metrics to the department's date
         departments_metrics[department_id].price_on_date[date_str] = price_metrics
 
-    # Convert the dictionary to a list of responses sorted by department_id
-    department_metrics_sorted = sorted(
-        departments_metrics.values(), key=lambda dept: dept.department_id
-    )
-    return department_metrics_sorted
+    # Rows are ordered by department_id, so the responses are too
+    return list(departments_metrics.values())
 
 
-@router.get("/{department_id}/count")
-async def get_products_count(department_id: int, session: Session = Depends(get_db)):
-    count = session.query(Product).where(Product.department_id == department_id).count()
+@router.get("/{department_id}/count", response_model=int)
+@cached
+async def get_products_count(
+    department_id: int, session: AsyncSession = Depends(get_db)
+):
+    query = (
+        select(func.count())
+        .select_from(Product)
+        .where(Product.department_id == department_id)
+    )
+    count = await session.scalar(query)
     return count
 
 
-@router.get("/{department_id}")
+@router.get("/{department_id}", response_model=Page[ProductResponse])
 async def get_products_from_department(
     department_id: int,
-    limit: int | None = None,
-    offset: int | None = None,
-    session: Session = Depends(get_db),
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    session: AsyncSession = Depends(get_db),
 ):
-    query = (
-        select(Product)
-        .where(Product.department_id == department_id)
-        .order_by(Product.name)
-        .limit(limit)
-        .offset(offset)
+    """
+    Lists the products of a department by name.
+    Pass `next_cursor` from the response as `cursor` to get the next page.
+    """
+    query = select_page(
+        select(Product).where(Product.department_id == department_id),
+        (Product.name, Product.id),
+        limit,
+        cursor,
     )
-    products = session.execute(query).scalars().all()
-    return products
+    products = (await session.execute(query)).scalars().all()
+    return make_page(products, limit, lambda product: (product.name, product.id))
@@ -1,305 +1,166 @@
 from datetime import datetime
-from typing import List
-from fastapi import APIRouter, Depends
-from sqlalchemy import and_, desc, func, select
-from sqlalchemy.orm import Session, joinedload
-from database.models import Price, Product
+from typing import Dict, List
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from database.deals import (
+    DEALS_SNAPSHOT,
+    refresh_deals_snapshot,
+    select_snapshot_deals,
+)
+from database.ingest_runs import select_try_ingest_xact_lock
+from database.models import (
+    DealSnapshot,
+    DepartmentPriceSnapshot,
+    SNAPSHOT_REFRESH_GENERATION,
+    IngestGeneration,
+    Product,
+    SnapshotInfo,
+)
 from database.operations import get_db
-from routers.models import DiscountDeal, DiscountDepartment
+from routers.cache import cached, expire_generation
+from routers.ingest import require_ingest_token
+from routers.models import (
+    DealsSnapshotInfo,
+    DiscountDeal,
+    DiscountDepartment,
+    ProductWithPricesResponse,
+)
 
 route_prefix = "/discount"
 router = APIRouter(prefix=route_prefix)
 
 
-@router.get("/")
-async def get_all_advertised_products(db: Session = Depends(get_db)):
+def to_discount_deal(row) -> DiscountDeal:
+    return DiscountDeal(
+        product_id=row.product_id,
+        product_name=row.product_name,
+        image=row.image,
+        advertised_price=row.advertised_price,
+        regular_price=row.regular_price,
+    )
+
 
+@router.get("/", response_model=List[ProductWithPricesResponse])
+@cached
+async def get_all_advertised_products(db: AsyncSession = Depends(get_db)):
     today = datetime.today()
+    advertised_product_ids = select(DealSnapshot.product_id).where(
+        DealSnapshot.starting_at <= today, DealSnapshot.ending_at >= today
+    )
     query = (
         select(Product)
+        .where(Product.id.in_(advertised_product_ids))
         .order_by(Product.department_id)
-        .join(Price, Product.prices)
-        .where(
-            and_(
-                Price.is_advertised == True,
-                Price.starting_at <= today,
-                Price.ending_at >= today,
-            )
-        )
-        .distinct()
-    ).options(joinedload(Product.prices))
+        .options(joinedload(Product.prices))
+    )
 
-    products = db.execute(query).unique().scalars().all()
+    products = (await db.execute(query)).unique().scalars().all()
     return products
 
 
-@router.get("/departments")
-async def get_all_departments_deals(db: Session = Depends(get_db)):
-    # Aggregate department-level price data
-    department_prices = db.execute(
-        select(
-            Product.department_id,
-            Product.department_name,
-            func.avg(Price.price).label("avg_price"),
-            func.min(Price.price).label("min_price"),
-            func.max(Price.price).label("max_price"),
-        )
-        .join(Price, Product.id == Price.product_id)
-        .group_by(Product.department_id, Product.department_name)
-    ).all()
+@router.get("/departments", response_model=List[DiscountDepartment])
+@cached
+async def get_all_departments_deals(db: AsyncSession = Depends(get_db)):
+    # Department-level price data from the snapshot
+    department_prices = (
+        (await db.execute(select(DepartmentPriceSnapshot))).scalars().all()
+    )
 
-    # Find advertised products and calculate price differences
-    # Get today's date
+    # Today's deals, already sorted on price difference in percent
     today = datetime.today()
-    advertised_products = db.execute(
-        select(
-            Product.id.label("product_id"),
-            Product.name.label("product_name"),
-            Product.image,
-            Product.department_name,
-            Product.department_id,
-            Price.price.label("advertised_price"),
-            (
-                select(Price.price)
-                .where(
-                    Price.product_id == Product.id,
-                    Price.is_advertised == False,
-                    # Price.starting_at < today,
-                )
-                .limit(1)  # Only get the closest match
-                .correlate(Product)  # Ensure correlation with the outer query
-                .scalar_subquery()
-            ).label("regular_price"),
-        )
-        .join(Price, Product.id == Price.product_id)
-        .where(
-            Price.is_advertised == True,
-            Price.starting_at <= today,
-            Price.ending_at >= today,
+    query = select_snapshot_deals(today, order_by_percent=True)
+    deals = (await db.execute(query)).all()
+    deals_by_department: Dict[int, List[DiscountDeal]] = {}
+    for row in deals:
+        deals_by_department.setdefault(row.department_id, []).append(
+            to_discount_deal(row)
         )
-        .distinct()  # Ensure no duplicates for the advertised prices
-    ).all()
 
     # Process and structure the response
     departments: List[DiscountDepartment] = []
     for dept in department_prices:
-        # Base department object
+        # Averages over the deals are calculated by the model
         department = DiscountDepartment(
             avg_price=dept.avg_price,
             min_price=dept.min_price,
             max_price=dept.max_price,
             department_name=dept.department_name,
             department_id=dept.department_id,
+            deals=deals_by_department.get(dept.department_id, []),
         )
-
-        # Add the deal to the respective department
-        for product in advertised_products:
-            # Base  deal object
-            if product.department_id == department.department_id:
-                deal = DiscountDeal(
-                    product_id=product.product_id,
-                    product_name=product.product_name,
-                    image=product.image,
-                    advertised_price=product.advertised_price,
-                    regular_price=product.regular_price,
-                )
-                department.deals.append(deal)
-
-        department.calc_avg_diff_amount()
-        department.calc_avg_diff_percent()
         departments.append(department)
 
-    # Sort deals on price difference in percent
-    for department in departments:
-        department.sort_deals_by_discount_percent()
-
     # Sort list by department_id
     departments_sorted_by_id = sorted(departments, key=lambda dept: dept.department_id)
 
     return departments_sorted_by_id
 
 
-@router.get("/departments/{department_id}")
-async def get_department_deals(department_id: int, db: Session = Depends(get_db)):
-
-    # Find advertised products and calculate price differences
-    # Get today's date
+@router.get("/departments/{department_id}", response_model=List[DiscountDeal])
+@cached
+async def get_department_deals(department_id: int, db: AsyncSession = Depends(get_db)):
     today = datetime.today()
-    # Subquery to find the closest starting_at date for each product
-    closest_advertisement_subquery = (
-        select(
-            Price.product_id,
-            func.min(Price.starting_at).label("closest_starting_at"),
-        )
-        .where(
-            and_(
-                Price.is_advertised == True,
-                Price.starting_at <= today,
-                Price.ending_at >= today,
-            )
-        )
-        .group_by(Price.product_id)
-        .subquery()
-    )
+    query = select_snapshot_deals(today, department_id=department_id)
+    department_deals = (await db.execute(query)).all()
+    return [to_discount_deal(row) for row in department_deals]
 
-    # Main query to get the relevant products with the closest advertisement
-    advertised_products = db.execute(
-        select(
-            Product.id.label("product_id"),
-            Product.name.label("product_name"),
-            Product.image,
-            Product.department_name,
-            Product.department_id,
-            Price.price.label("advertised_price"),
-            (
-                select(func.coalesce(Price.price, Price.price))  # Handle NULLs
-                .where(
-                    Price.product_id == Product.id,
-                    Price.is_advertised == False,
-                )
-                .limit(1)
-                .correlate(Product)
-                .scalar_subquery()
-            ).label("regular_price"),
-        )
-        .join(Price, Product.id == Price.product_id)
-        .join(
-            closest_advertisement_subquery,
-            and_(
-                Price.product_id == closest_advertisement_subquery.c.product_id,
-                Price.starting_at
-                == closest_advertisement_subquery.c.closest_starting_at,
-            ),
-        )
-        .where(
-            Product.department_id == department_id,
-        )
-        .distinct()
-    ).all()
 
-    # Process and structure the response
-    department_deals = [
-        DiscountDeal(
-            product_id=product.product_id,
-            product_name=product.product_name,
-            image=product.image,
-            advertised_price=product.advertised_price,
-            regular_price=product.regular_price,
-        )
-        for product in advertised_products
-    ]
-    department_deals_sorted = sorted(
-        department_deals, key=lambda product: product.difference_amount, reverse=True
-    )
-
-    return department_deals_sorted
-
-
-@router.get("/top-10-discounts")
-async def get_top_10_discount_products(db: Session = Depends(get_db)):
-    # Get today's date
+@router.get("/top-10-discounts", response_model=List[DiscountDeal])
+@cached
+async def get_top_10_discount_products(db: AsyncSession = Depends(get_db)):
     today = datetime.today()
+    query = select_snapshot_deals(today, limit=10)
+    top_10_deals = (await db.execute(query)).all()
+    return [to_discount_deal(row) for row in top_10_deals]
 
-    # Find advertised products and calculate price differences
-    advertised_products = db.execute(
-        select(
-            Product.id.label("product_id"),
-            Product.name.label("product_name"),
-            Product.image,
-            Product.department_name,
-            Product.department_id,
-            Price.price.label("advertised_price"),
-            (
-                select(Price.price)
-                .where(
-                    Price.product_id == Product.id,
-                    Price.is_advertised == False,
-                    # Price.starting_at < today,
-                )
-                .limit(1)  # Only get the closest match
-                .correlate(Product)  # Ensure correlation with the outer query
-                .scalar_subquery()
-            ).label("regular_price"),
-        )
-        .join(Price, Product.id == Price.product_id)
-        .where(
-            Price.is_advertised == True,
-            Price.starting_at <= today,
-            Price.ending_at >= today,
-        )
-        .distinct()  # Ensure no duplicates for the advertised prices
-    ).all()
-
-    allDeals = [
-        DiscountDeal(
-            product_id=product.product_id,
-            product_name=product.product_name,
-            image=product.image,
-            advertised_price=product.advertised_price,
-            regular_price=product.regular_price,
-        )
-        for product in advertised_products
-    ]
-
-    top_10_deals = sorted(
-        allDeals, key=lambda product: product.difference_amount, reverse=True
-    )[:10]
 
-    return top_10_deals
+@router.get("/under-50-percent", response_model=List[DiscountDeal])
+@cached
+async def get_products_under_half_price(db: AsyncSession = Depends(get_db)):
+    today = datetime.today()
+    query = select_snapshot_deals(
+        today, min_difference_percent=50, order_by_percent=True
+    )
+    under_half_price_products = (await db.execute(query)).all()
+    return [to_discount_deal(row) for row in under_half_price_products]
 
 
-@router.get("/under-50-percent")
-async def get_products_under_half_price(db: Session = Depends(get_db)):
+@router.get("/snapshot", response_model=DealsSnapshotInfo)
+async def get_deals_snapshot_info(db: AsyncSession = Depends(get_db)):
+    snapshot = await db.get(SnapshotInfo, DEALS_SNAPSHOT)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Deals snapshot not built yet")
 
-    # Find advertised products and calculate price differences
-    # Get today's date
-    today = datetime.today()
-    advertised_products = db.execute(
-        select(
-            Product.id.label("product_id"),
-            Product.name.label("product_name"),
-            Product.image,
-            Product.department_name,
-            Product.department_id,
-            Price.price.label("advertised_price"),
-            (
-                select(Price.price)
-                .where(
-                    Price.product_id == Product.id,
-                    Price.is_advertised == False,
-                    # Price.starting_at < today,
-                )
-                .limit(1)  # Only get the closest match
-                .correlate(Product)  # Ensure correlation with the outer query
-                .scalar_subquery()
-            ).label("regular_price"),
-        )
-        .join(Price, Product.id == Price.product_id)
-        .where(
-            Price.is_advertised == True,
-            Price.starting_at <= today,
-            Price.ending_at >= today,
+    # Deals valid now, upcoming ones are counted once they start
+    now = datetime.now()
+    deals_count = await db.scalar(
+        select(func.count(DealSnapshot.product_id.distinct())).where(
+            DealSnapshot.starting_at <= now, DealSnapshot.ending_at >= now
         )
-        .distinct()  # Ensure no duplicates for the advertised prices
-    ).all()
-
-    allDeals = [
-        DiscountDeal(
-            product_id=product.product_id,
-            product_name=product.product_name,
-            image=product.image,
-            advertised_price=product.advertised_price,
-            regular_price=product.regular_price,
-        )
-        for product in advertised_products
-    ]
-    under_half_price_products = list(
-        filter(lambda product: product.difference_percent >= 50, allDeals)
     )
-    under_half_price_products_sorted = sorted(
-        under_half_price_products,
-        key=lambda product: product.difference_percent,
-        reverse=True,
+    return DealsSnapshotInfo(built_at=snapshot.built_at, deals=deals_count)
+
+
+@router.post(
+    "/snapshot/refresh",
+    response_model=DealsSnapshotInfo,
+    dependencies=[Depends(require_ingest_token)],
+)
+async def refresh_deals(db: AsyncSession = Depends(get_db)):
+    """Rebuilds the deal snapshot. Returns 409 while an ingest or another refresh runs."""
+    # Held until the refresh commits, so it never rebuilds alongside an ingest
+    if not await db.scalar(select_try_ingest_xact_lock()):
+        raise HTTPException(status_code=409, detail="An ingest is running")
+
+    # Record a new generation with the snapshot, so cached responses expire
+    now = datetime.now()
+    db.add(
+        IngestGeneration(
+            kind=SNAPSHOT_REFRESH_GENERATION, started_at=now, committed_at=now
+        )
     )
-
-    return under_half_price_products_sorted
+    await db.run_sync(refresh_deals_snapshot)
+    expire_generation()
+    return await get_deals_snapshot_info(db)
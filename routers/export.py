@@ -0,0 +1,124 @@
+import csv
+from datetime import datetime
+import io
+import json
+from typing import AsyncIterator, List, Literal
+from fastapi import APIRouter, HTTPException, Path
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import Select, select
+from database.models import Price, Product
+from database.operations import async_db_session
+from database.parquet_export import list_parquet_files, parquet_export_dir
+from routers.models import ParquetFile, PriceResponse, ProductResponse
+from routers.utils import validate_date
+
+route_prefix = "/export"
+router = APIRouter(prefix=route_prefix)
+
+# Rows fetched from the server-side cursor, and written, per chunk
+EXPORT_CHUNK_SIZE = 1000
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+ExportFormat = Literal["ndjson", "csv"]
+
+
+def to_json(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot export {type(value).__name__}")
+
+
+async def stream_rows(query: Select, format: ExportFormat) -> AsyncIterator[str]:
+    """
+    Streams the rows of `query` as NDJSON or CSV. The session is opened here,
+    rather than taken from `get_db`, so it stays open while the response is sent.
+    """
+    columns = [column.name for column in query.selected_columns]
+    async with async_db_session() as session:
+        result = await session.stream(
+            query.execution_options(yield_per=EXPORT_CHUNK_SIZE)
+        )
+
+        if format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            async for rows in result.partitions():
+                writer.writerows(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            async for rows in result.partitions():
+                yield "".join(
+                    json.dumps(
+                        dict(zip(columns, row)), default=to_json, ensure_ascii=False
+                    )
+                    + "\n"
+                    for row in rows
+                )
+
+
+def export_response(
+    query: Select, format: ExportFormat, filename: str
+) -> StreamingResponse:
+    return StreamingResponse(
+        stream_rows(query, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format}"'},
+    )
+
+
+@router.get("/products")
+async def export_products(format: ExportFormat = "ndjson"):
+    """Streams every product, with the same fields as the product endpoints."""
+    query = select(
+        *[getattr(Product, field) for field in ProductResponse.model_fields]
+    ).order_by(Product.id)
+    return export_response(query, format, "products")
+
+
+@router.get("/prices")
+async def export_prices(
+    start: str | None = None,
+    end: str | None = None,
+    format: ExportFormat = "ndjson",
+):
+    """
+    Streams every price point valid at some point from start up to, but not
+    including, end. Both are optional.
+    """
+    query = select(
+        *[getattr(Price, field) for field in PriceResponse.model_fields]
+    ).order_by(Price.id)
+    if start:
+        query = query.where(Price.ending_at >= validate_date(start))
+    if end:
+        query = query.where(Price.starting_at < validate_date(end))
+    return export_response(query, format, "prices")
+
+
+@router.get("/parquet", response_model=List[ParquetFile])
+async def list_parquet_exports():
+    """Lists the Parquet files written by `python -m database.parquet_export`."""
+    return [
+        ParquetFile(
+            month=path.parent.name.removeprefix("month="),
+            name=path.name,
+            size=path.stat().st_size,
+        )
+        for path in list_parquet_files()
+    ]
+
+
+@router.get("/parquet/{month}/{name}")
+async def download_parquet_export(
+    month: str = Path(pattern=r"^\d{4}-\d{2}$"),
+    name: str = Path(pattern=r"^part-\d+-\d+\.parquet$"),
+):
+    path = parquet_export_dir() / f"month={month}" / name
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="Export file not found")
+    return FileResponse(path, media_type="application/vnd.apache.parquet")
@@ -0,0 +1,73 @@
+from datetime import date, datetime, time, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+from routers.cache import current_generation
+
+# Routes whose responses only change with a new ingest or a new day
+CONDITIONAL_PREFIXES = (
+    "/product",
+    "/prices",
+    "/department",
+    "/discount",
+    "/export/products",
+    "/export/prices",
+)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # Weak comparison, as used for If-None-Match
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+
+def not_modified_since(if_modified_since: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+
+async def conditional_get(request: Request, call_next):
+    """
+    Adds ETag and Last-Modified headers derived from the latest ingest, and
+    answers matching If-None-Match / If-Modified-Since requests with a 304
+    before the endpoint runs any query.
+    """
+    if request.method not in ("GET", "HEAD") or not request.url.path.startswith(
+        CONDITIONAL_PREFIXES
+    ):
+        return await call_next(request)
+
+    generation_id, committed_at = await current_generation()
+    today = date.today()
+    etag = f'W/"{generation_id}-{today.isoformat()}"'
+    # Responses can also change at midnight, e.g. when deals end
+    last_modified = datetime.combine(today, time.min)
+    if committed_at:
+        last_modified = max(last_modified, committed_at)
+    last_modified = last_modified.astimezone(timezone.utc)
+
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified.replace(microsecond=0), True),
+        "Cache-Control": "no-cache",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        not_modified = etag_matches(if_none_match, etag)
+    elif if_modified_since is not None:
+        not_modified = not_modified_since(if_modified_since, last_modified)
+    else:
+        not_modified = False
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers.update(headers)
+    return response
@@ -0,0 +1,141 @@
+import asyncio
+from datetime import datetime, time, timedelta
+import secrets
+from fastapi import APIRouter, Depends, Header, HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.env import getenv
+from database.ingest_runs import (
+    ACTIVE_PHASES,
+    select_ingest_lock_held,
+    select_last_success_at,
+    select_latest_run,
+)
+from database.models import INGEST_GENERATION, IngestGeneration
+from database.operations import get_db
+from routers.cache import expire_generation
+from routers.models import IngestStatusResponse
+
+route_prefix = "/ingest"
+router = APIRouter(prefix=route_prefix)
+
+
+def ingest_schedule_enabled() -> bool:
+    # The scheduler is off unless enabled, for deployments that still ingest
+    # from an outside cron. Runs are locked either way.
+    return getenv("INGEST_SCHEDULE_ENABLED", "").lower() in ("1", "true", "yes")
+
+
+def ingest_schedule_time() -> time:
+    # Local time of the daily run
+    return time.fromisoformat(getenv("INGEST_SCHEDULE_TIME", "06:00"))
+
+
+def ingest_trigger_token() -> str | None:
+    # Manual runs, e.g. POST /ingest/run, require it in the X-Ingest-Token
+    # header, and are turned off when it isn't set
+    return getenv("INGEST_TRIGGER_TOKEN")
+
+
+def require_ingest_token(x_ingest_token: str | None = Header(None)):
+    """Dependency of the endpoints that start a run or rebuild derived data."""
+    token = ingest_trigger_token()
+    if not token:
+        raise HTTPException(
+            status_code=403, detail="Manual runs are off, set INGEST_TRIGGER_TOKEN"
+        )
+    if not secrets.compare_digest(x_ingest_token or "", token):
+        raise HTTPException(status_code=403, detail="Invalid ingest token")
+
+
+next_run_at: datetime | None = None
+# References to running tasks, so they aren't garbage collected
+_background_tasks = set()
+
+
+def next_scheduled_run(now: datetime) -> datetime:
+    run_at = datetime.combine(now.date(), ingest_schedule_time())
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return run_at
+
+
+async def run_ingest_in_background():
+    # Imported here, so workers only load the Rema client and the Parquet
+    # exporter when they actually ingest
+    from database.ingest import run_ingest
+
+    # In a worker thread, so the ingest never blocks request handling
+    try:
+        await asyncio.to_thread(run_ingest)
+    except Exception as e:
+        print(f"Ingest failed: {e}")
+    finally:
+        expire_generation()
+
+
+async def ingest_scheduler():
+    """Runs the ingest every day at INGEST_SCHEDULE_TIME, started from the app's lifespan."""
+    global next_run_at
+    while True:
+        next_run_at = next_scheduled_run(datetime.now())
+        await asyncio.sleep((next_run_at - datetime.now()).total_seconds())
+        await run_ingest_in_background()
+
+
+@router.get("/status", response_model=IngestStatusResponse)
+async def get_ingest_status(session: AsyncSession = Depends(get_db)):
+    """The latest ingest run by any process, and when one last succeeded."""
+    running = await session.scalar(select_ingest_lock_held())
+    latest_run = await session.scalar(select_latest_run())
+    last_failed_run = await session.scalar(select_latest_run("failed"))
+    last_success_at = await session.scalar(select_last_success_at())
+    last_committed_at = await session.scalar(
+        select(func.max(IngestGeneration.committed_at)).where(
+            IngestGeneration.kind == INGEST_GENERATION
+        )
+    )
+
+    latest_run_fields = {}
+    if latest_run is not None:
+        phase = latest_run.phase
+        # The process running it stopped without recording how it ended
+        if phase in ACTIVE_PHASES and not running:
+            phase = "interrupted"
+        ended_at = latest_run.finished_at or datetime.now()
+        latest_run_fields = dict(
+            phase=phase,
+            started_at=latest_run.started_at,
+            finished_at=latest_run.finished_at,
+            duration_seconds=(ended_at - latest_run.started_at).total_seconds(),
+            products_processed=latest_run.products_processed,
+            new_products=latest_run.new_products,
+            new_prices=latest_run.new_prices,
+            updated_products=latest_run.updated_products,
+        )
+
+    return IngestStatusResponse(
+        running=running,
+        last_error=last_failed_run.error if last_failed_run else None,
+        last_success_at=last_success_at,
+        last_committed_at=last_committed_at,
+        next_run_at=next_run_at,
+        **latest_run_fields,
+    )
+
+
+@router.post(
+    "/run",
+    status_code=202,
+    response_model=IngestStatusResponse,
+    dependencies=[Depends(require_ingest_token)],
+)
+async def trigger_ingest(session: AsyncSession = Depends(get_db)):
+    """Starts an ingest in the background. Returns 409 if any process is already running one."""
+    if await session.scalar(select_ingest_lock_held()):
+        raise HTTPException(status_code=409, detail="An ingest is already running")
+
+    task = asyncio.create_task(run_ingest_in_background())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return await get_ingest_status(session)
@@ -0,0 +1,98 @@
+import time
+from fastapi import APIRouter, Depends, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram
+from prometheus_client import generate_latest
+from sqlalchemy import select
+from starlette.routing import Match
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.instrumentation import QueryStats, current_query_stats
+from database.models import INGEST_GENERATION, IngestGeneration
+from database.operations import get_db
+
+router = APIRouter()
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "Requests handled", ["method", "route", "status"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time spent handling requests", ["method", "route"]
+)
+SQL_QUERIES = Counter("sql_queries_total", "SQL statements executed", ["route"])
+SQL_QUERY_SECONDS = Histogram(
+    "sql_query_duration_seconds", "Time spent executing SQL statements", ["route"]
+)
+
+LAST_INGEST_SECONDS = Gauge(
+    "last_ingest_duration_seconds", "Duration of the last ingest"
+)
+LAST_INGEST_COMMITTED = Gauge(
+    "last_ingest_committed_timestamp_seconds", "When the last ingest was committed"
+)
+LAST_INGEST_ROWS = Gauge(
+    "last_ingest_rows", "Rows written by the last ingest", ["kind"]
+)
+
+
+def iter_routes(routes):
+    for route in routes:
+        # Newer FastAPI versions keep included routers nested
+        included = getattr(route, "original_router", None)
+        if included is not None:
+            yield from iter_routes(included.routes)
+        else:
+            yield route
+
+
+def route_path_of(request: Request) -> str:
+    """The route's path template, so ids in the path don't add label values."""
+    route = request.scope.get("route")
+    if route is None:
+        # Not routed, e.g. answered with a 304 by conditional_get
+        for candidate in iter_routes(request.app.routes):
+            match, _ = candidate.matches(request.scope)
+            if match == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", "unmatched")
+
+
+async def record_request_metrics(request: Request, call_next):
+    query_stats = QueryStats()
+    token = current_query_stats.set(query_stats)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        duration = time.perf_counter() - started
+        current_query_stats.reset(token)
+
+        route_path = route_path_of(request)
+
+        HTTP_REQUESTS.labels(request.method, route_path, status).inc()
+        HTTP_REQUEST_SECONDS.labels(request.method, route_path).observe(duration)
+        SQL_QUERIES.labels(route_path).inc(len(query_stats.durations))
+        for query_duration in query_stats.durations:
+            SQL_QUERY_SECONDS.labels(route_path).observe(query_duration)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics(session: AsyncSession = Depends(get_db)):
+    last_ingest = await session.scalar(
+        select(IngestGeneration)
+        .where(IngestGeneration.kind == INGEST_GENERATION)
+        .order_by(IngestGeneration.id.desc())
+        .limit(1)
+    )
+    if last_ingest is not None:
+        LAST_INGEST_SECONDS.set(
+            (last_ingest.committed_at - last_ingest.started_at).total_seconds()
+        )
+        LAST_INGEST_COMMITTED.set(last_ingest.committed_at.timestamp())
+        LAST_INGEST_ROWS.labels("products").set(last_ingest.new_products)
+        LAST_INGEST_ROWS.labels("prices").set(last_ingest.new_prices)
+        LAST_INGEST_ROWS.labels("updated_products").set(last_ingest.updated_products)
+
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,24 +1,99 @@
-from datetime import datetime
-from typing import Dict, List
-from database.models import Price
+from datetime import date, datetime
+from typing import Dict, Generic, List, Optional, TypeVar
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
+T = TypeVar("T")
 
-class PriceOnDate:
-    def __init__(self, price: Price) -> None:
-        self.price = price.price
-        self.is_advertised = price.is_advertised
-        self.is_campaign = price.is_campaign
-        self.compare_unit_price = price.compare_unit_price
-        self.compare_unit = price.compare_unit
+# Most products a batch request may ask for
+MAX_BATCH_SIZE = 200
 
 
-class ProductPricesResponse:
-    def __init__(self, product_id: int, price_on_date: Dict[str, PriceOnDate]) -> None:
-        self.product_id = product_id
-        self.price_on_date = price_on_date
+class PriceResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    product_id: int
+    price: float
+    logged_on: datetime
+    price_over_max_quantity: Optional[float]
+    max_quantity: Optional[int]
+    is_advertised: bool
+    is_campaign: bool
+    starting_at: datetime
+    ending_at: datetime
+    deposit: Optional[float]
+    compare_unit: str
+    compare_unit_price: float
+    consumption_unit: Optional[str]
+    consumption_quantity: Optional[int]
+
+
+class ProductResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str
+    updated: datetime
+    underline: str
+    age_limit: Optional[int]
+    description: Optional[str]
+    info: str
+    image: Optional[str]
+    temperature_zone: Optional[int]
+    is_self_scale_item: bool
+    is_weight_item: bool
+    is_available_in_all_stores: bool
+    is_batch_item: bool
+    department_name: str
+    department_id: int
+
+
+class ProductWithPricesResponse(ProductResponse):
+    prices: List[PriceResponse]
+
+
+class Department(BaseModel):
+    name: str
+    id: int
+
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str]
+
+
+class ProductBatchRequest(BaseModel):
+    product_ids: List[int] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+class PricesBatchRequest(ProductBatchRequest):
+    start: Optional[date] = None
+    end: Optional[date] = None
+
+
+class PriceOnDate(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    price: float
+    is_advertised: bool
+    is_campaign: bool
+    compare_unit_price: float
+    compare_unit: str
+
+
+class ProductPricesResponse(BaseModel):
+    product_id: int
+    price_on_date: Dict[str, PriceOnDate]
+    avg_price: float = 0.0
+    current_price: Optional[float] = None
+    lowest_price: Optional[float] = None
+
+    @model_validator(mode="after")
+    def calc_price_summary(self):
         self.avg_price = self.get_avg_price()
         self.current_price = self.get_current_price()
         self.lowest_price = self.get_lowest_price()
+        return self
 
     def get_avg_price(self) -> float:
         """Calculate the average price."""
@@ -48,105 +123,105 @@ class ProductPricesResponse:
                 return self.price_on_date[date_str].price
 
 
-class DiscountDepartment:
-    def __init__(
-        self,
-        avg_price,
-        min_price,
-        max_price,
-        department_name,
-        department_id,
-    ) -> None:
-
-        self.avg_price = round(avg_price, 2)
-        self.min_price = round(min_price, 2)
-        self.max_price = round(max_price, 2)
-        self.avg_difference_amount: float
-        self.avg_difference_percent: float
-        self.department_name = department_name
-        self.department_id = department_id
-        self.deals: List[DiscountDeal] = []
-
-    def calc_avg_diff_amount(self):
-        if len(self.deals) == 0:
-            return 0
-
-        products_diff_amount = sum(
-            [product.difference_amount for product in self.deals]
-        ) / len(self.deals)
-        self.avg_difference_amount = round(products_diff_amount, 2)
-
-    def calc_avg_diff_percent(self):
-        if len(self.deals) == 0:
-            return 0
-
-        products_diff_percent = sum(
-            [product.difference_percent for product in self.deals]
-        ) / len(self.deals)
-        self.avg_difference_percent = round(products_diff_percent, 2)
-
-    def sort_deals_by_discount_percent(self):
-        self.deals = sorted(
-            self.deals,
-            key=lambda deal: deal.difference_percent,
-            reverse=True,
-        )
-
-
-class DiscountDeal:
-    def __init__(
-        self,
-        product_id,
-        product_name,
-        image,
-        advertised_price,
-        regular_price,
-    ) -> None:
-        self.product_id = product_id
-        self.product_name = product_name
-        self.image = image
-        self.advertised_price = advertised_price
-        self.regular_price = (
-            regular_price if regular_price is not None else advertised_price
-        )
-        self.difference_amount = self.calc_difference_amount()
-        self.difference_percent = self.calc_difference_percent()
-
-    def calc_difference_amount(self, rounded=True):
-        difference = self.regular_price - self.advertised_price
-        if rounded:
-            return round(difference, 2)
-        return difference
-
-    def calc_difference_percent(self):
-        difference_percent = (
-            self.calc_difference_amount(rounded=False) / self.regular_price
-        ) * 100
-        return round(difference_percent, 2)
-
-
-class PriceMetricsOnDate:
-    def __init__(
-        self,
-        median_price: float,
-        min_price: float,
-        max_price: float,
-        price_volatility: float,
-    ) -> None:
-        self.median_price = round(median_price, 2)
-        self.min_price = min_price
-        self.max_price = max_price
-        self.price_volatility = round(price_volatility, 2)
-
-
-class DepartmentPriceMetricsResponse:
-    def __init__(
-        self,
-        department_id: int,
-        department_name: str,
-        price_on_date: Dict[str, PriceMetricsOnDate],
-    ) -> None:
-
-        self.department_id = department_id
-        self.department_name = department_name
-        self.price_on_date = price_on_date
+class DiscountDeal(BaseModel):
+    product_id: int
+    product_name: str
+    image: Optional[str]
+    advertised_price: float
+    regular_price: float
+    difference_amount: float
+    difference_percent: float
+
+    @model_validator(mode="before")
+    @classmethod
+    def calc_differences(cls, data: Dict) -> Dict:
+        advertised_price = data["advertised_price"]
+        regular_price = data.get("regular_price")
+        if regular_price is None:
+            regular_price = advertised_price
+
+        difference = regular_price - advertised_price
+        return {
+            **data,
+            "regular_price": regular_price,
+            "difference_amount": round(difference, 2),
+            "difference_percent": round(difference / regular_price * 100, 2),
+        }
+
+
+class DiscountDepartment(BaseModel):
+    avg_price: float
+    min_price: float
+    max_price: float
+    avg_difference_amount: float = 0.0
+    avg_difference_percent: float = 0.0
+    department_name: str
+    department_id: int
+    deals: List[DiscountDeal] = []
+
+    @model_validator(mode="after")
+    def calc_averages(self):
+        self.avg_price = round(self.avg_price, 2)
+        self.min_price = round(self.min_price, 2)
+        self.max_price = round(self.max_price, 2)
+        if self.deals:
+            self.avg_difference_amount = round(
+                sum(deal.difference_amount for deal in self.deals) / len(self.deals), 2
+            )
+            self.avg_difference_percent = round(
+                sum(deal.difference_percent for deal in self.deals) / len(self.deals),
+                2,
+            )
+        return self
+
+
+class PriceMetricsOnDate(BaseModel):
+    avg_price: float
+    median_price: float
+    min_price: float
+    max_price: float
+    price_volatility: float
+
+    @model_validator(mode="after")
+    def round_metrics(self):
+        self.avg_price = round(self.avg_price, 2)
+        self.median_price = round(self.median_price, 2)
+        self.price_volatility = round(self.price_volatility, 2)
+        return self
+
+
+class DepartmentPriceMetricsResponse(BaseModel):
+    department_id: int
+    department_name: str
+    price_on_date: Dict[str, PriceMetricsOnDate]
+
+
+class ParquetFile(BaseModel):
+    month: str
+    name: str
+    size: int
+
+
+class IngestStatusResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    # Of the latest run, by any process
+    phase: str = "idle"
+    running: bool
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    duration_seconds: Optional[float] = None
+    products_processed: int = 0
+    new_products: int = 0
+    new_prices: int = 0
+    updated_products: int = 0
+    last_error: Optional[str]
+    last_success_at: Optional[datetime]
+    # The latest ingest committed by any process
+    last_committed_at: Optional[datetime]
+    next_run_at: Optional[datetime]
+
+
+class DealsSnapshotInfo(BaseModel):
+    built_at: datetime
+    deals: int
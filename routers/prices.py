@@ -1,57 +1,132 @@
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
+import heapq
+from typing import Dict, List, Sequence
 from fastapi import APIRouter, Depends, HTTPException
-import pandas as pd
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from database.models import Price
 from database.operations import get_db
-from routers.models import PriceOnDate, ProductPricesResponse
+from routers.models import PriceOnDate, PricesBatchRequest, ProductPricesResponse
 from routers.utils import validate_date
 
 route_prefix = "/prices"
 router = APIRouter(prefix=route_prefix)
 
+ONE_DAY = timedelta(days=1)
+DEFAULT_START_DATE = datetime(year=2023, month=1, day=1)
 
-@router.get("/{product_id}")
+
+def build_price_timeline(
+    price_points: Sequence[Price], start_date: datetime, end_date: datetime
+) -> Dict[str, PriceOnDate]:
+    """
+    Finds the price valid on each day from start_date up to, but not including,
+    end_date. When several price points are valid on the same day, the most
+    relevant one is the price with the shortest interval, i.e. the lowest number
+    of days between starting_at and ending_at.
+    """
+    price_on_date = {}
+    price_points = sorted(price_points, key=lambda price: price.starting_at)
+    last_date = end_date - ONE_DAY
+
+    # Sweep the days in order, keeping the price points valid on the current day
+    # in a heap ordered by interval length
+    active = []
+    next_point = 0
+    date = start_date
+    while date <= last_date:
+        while (
+            next_point < len(price_points)
+            and price_points[next_point].starting_at <= date
+        ):
+            price = price_points[next_point]
+            interval_days = (price.ending_at - price.starting_at).days
+            # Converted once, and shared by every day the price is used on
+            price_data = PriceOnDate.model_validate(price)
+            heapq.heappush(active, (interval_days, next_point, price, price_data))
+            next_point += 1
+
+        # Drop price points that ended before this day
+        while active and active[0][2].ending_at < date:
+            heapq.heappop(active)
+
+        if active:
+            price_on_date[date.strftime("%Y-%m-%d")] = active[0][3]
+        elif next_point < len(price_points):
+            # No price on this day, skip ahead to the day the next price starts
+            days_until_next = -(
+                -(price_points[next_point].starting_at - date) // ONE_DAY
+            )
+            date += days_until_next * ONE_DAY
+            continue
+        else:
+            break  # no price points left
+
+        date += ONE_DAY
+
+    return price_on_date
+
+
+def select_price_points(
+    product_ids: List[int], start_date: datetime, end_date: datetime
+) -> Select:
+    # Only load the price points overlapping the requested window
+    return select(Price).where(
+        Price.product_id.in_(product_ids),
+        Price.starting_at <= end_date - ONE_DAY,
+        Price.ending_at >= start_date,
+    )
+
+
+@router.get("/{product_id}", response_model=ProductPricesResponse)
 async def get_product_prices(
     product_id: int,
     start: str | None = None,
     end: str | None = None,
-    session: Session = Depends(get_db),
+    session: AsyncSession = Depends(get_db),
 ):
-    query = select(Price).where(Price.product_id == product_id)
-    price_points = session.execute(query).scalars().all()
-    price_on_date = {}
+    start_date = validate_date(start) if start else DEFAULT_START_DATE
+    end_date = validate_date(end) if end else datetime.now()
+
+    query = select_price_points([product_id], start_date, end_date)
+    price_points = (await session.execute(query)).scalars().all()
 
     if price_points is None:
         raise HTTPException(status_code=404, detail="No prices found for this product")
 
-    start_date = validate_date(start) if start else datetime(year=2023, month=1, day=1)
-    end_date = validate_date(end) if end else datetime.now()
+    price_on_date = build_price_timeline(price_points, start_date, end_date)
+    return ProductPricesResponse(product_id=product_id, price_on_date=price_on_date)
 
-    dates_between_start_and_end = pd.date_range(
-        start_date, end_date - timedelta(days=1), freq="d"
+
+@router.post("/batch", response_model=List[ProductPricesResponse])
+async def get_batch_product_prices(
+    request: PricesBatchRequest, session: AsyncSession = Depends(get_db)
+):
+    """
+    Price timelines for several products in one call, fetched with one query.
+    Returns one entry per requested product id, in the requested order.
+    """
+    start_date = (
+        datetime.combine(request.start, time.min)
+        if request.start
+        else DEFAULT_START_DATE
     )
-    for date in dates_between_start_and_end:
-        date_str = date.strftime("%Y-%m-%d")  # returns str YYYY-MM-DD
-        price_points_in_range = list(
-            filter(
-                lambda price: price.starting_at <= date <= price.ending_at,
-                price_points,
-            )
-        )
-        if len(price_points_in_range) == 0:
-            continue  # no price point found
-        elif len(price_points_in_range) == 1:
-            price_on_date[date_str] = PriceOnDate(price=price_points_in_range[0])
-        else:
-            # there are more than one price point valid  during this date
-            # to find the most relevant price point, we look at the price with the shortest interval
-            # i.e. the lowest number of days between starting_at and ending_at
-            most_relevant_price = min(
-                price_points_in_range,
-                key=lambda price: (price.ending_at - price.starting_at).days,
-            )
-            price_on_date[date_str] = PriceOnDate(price=most_relevant_price)
+    end_date = (
+        datetime.combine(request.end, time.min) if request.end else datetime.now()
+    )
+    product_ids = list(dict.fromkeys(request.product_ids))
 
-    return ProductPricesResponse(product_id=product_id, price_on_date=price_on_date)
+    query = select_price_points(product_ids, start_date, end_date)
+    price_points_by_product: Dict[int, List[Price]] = {
+        product_id: [] for product_id in product_ids
+    }
+    for price in (await session.execute(query)).scalars():
+        price_points_by_product[price.product_id].append(price)
+
+    return [
+        ProductPricesResponse(
+            product_id=product_id,
+            price_on_date=build_price_timeline(price_points, start_date, end_date),
+        )
+        for product_id, price_points in price_points_by_product.items()
+    ]
@@ -1,62 +1,142 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
-from sqlalchemy.orm import Session, joinedload
+import re
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import REAL, and_, func, literal, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 from database.models import Product
 from database.operations import get_db
+from routers.cache import cached
+from routers.models import (
+    Page,
+    ProductBatchRequest,
+    ProductResponse,
+    ProductWithPricesResponse,
+)
+from routers.utils import (
+    MAX_PAGE_SIZE,
+    PAGE_SIZE,
+    decode_cursor,
+    encode_cursor,
+    make_page,
+    select_page,
+)
 
 route_prefix = "/product"
 router = APIRouter(prefix=route_prefix)
 
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
 
-@router.get("/")
-async def get_all_products(
-    limit: int | None = None,
-    offset: int | None = None,
-    session: Session = Depends(get_db),
-):
 
-    query = (
-        select(Product)
-        .order_by(Product.department_id, Product.name)
-        .limit(limit)
-        .offset(offset)
-    )
+def to_prefix_tsquery(query: str) -> str | None:
+    # Every word must match, and the last one may still be being typed
+    words = re.findall(r"\w+", query.lower())
+    if not words:
+        return None
+    return " & ".join(f"{word}:*" for word in words)
 
-    products = session.execute(query).scalars().all()
 
-    return products
+@router.get("/", response_model=Page[ProductResponse])
+async def get_all_products(
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    Lists products by department and name.
+    Pass `next_cursor` from the response as `cursor` to get the next page.
+    """
+    sort_columns = (Product.department_id, Product.name, Product.id)
+    query = select_page(select(Product), sort_columns, limit, cursor)
+
+    products = (await session.execute(query)).scalars().all()
+
+    return make_page(
+        products,
+        limit,
+        lambda product: (product.department_id, product.name, product.id),
+    )
 
 
-@router.get("/search/")
+@router.get("/search/", response_model=Page[ProductResponse])
 async def search_products(
     query: str | None = None,
-    session: Session = Depends(get_db),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    session: AsyncSession = Depends(get_db),
 ):
-    if not query:
+    """
+    Searches product names, underlines and descriptions, best matches first.
+    Pass `next_cursor` from the response as `cursor` to get the next page.
+    """
+    tsquery_text = to_prefix_tsquery(query) if query else None
+    if not tsquery_text:
         raise HTTPException(status_code=400, detail="Query parameter is required")
 
-    statement = select(Product).filter(Product.name.ilike(f"%{query}%"))
-    result = session.execute(statement).scalars().unique().all()
-
-    if not result:
+    tsquery = func.to_tsquery("simple", tsquery_text)
+    rank = func.ts_rank_cd(Product.search_vector, tsquery)
+    statement = (
+        select(Product, rank.label("rank"))
+        .where(Product.search_vector.op("@@")(tsquery))
+        .order_by(rank.desc(), Product.id)
+        .limit(limit + 1)
+    )
+    if cursor:
+        last_rank, last_id = decode_cursor(cursor, (float, int))
+        last_rank = literal(last_rank, REAL)
+        statement = statement.where(
+            or_(rank < last_rank, and_(rank == last_rank, Product.id > last_id))
+        )
+
+    rows = (await session.execute(statement)).all()
+    if not rows and not cursor:
         raise HTTPException(status_code=404, detail="No products found")
 
-    return result
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].rank, rows[-1].Product.id)
+
+    return Page(items=[row.Product for row in rows], next_cursor=next_cursor)
 
 
-@router.get("/count")
-async def get_products_count(session: Session = Depends(get_db)):
-    count = session.query(Product).count()
+@router.get("/count", response_model=int)
+@cached
+async def get_products_count(session: AsyncSession = Depends(get_db)):
+    count = await session.scalar(select(func.count()).select_from(Product))
     return count
 
 
-@router.get("/{id}")
+@router.post("/batch", response_model=List[ProductWithPricesResponse])
+async def get_products_by_ids(
+    request: ProductBatchRequest, session: AsyncSession = Depends(get_db)
+):
+    """
+    Several products with their prices in one call. Unknown ids are left out,
+    the rest are returned in the requested order.
+    """
+    query = (
+        select(Product)
+        .options(joinedload(Product.prices))
+        .where(Product.id.in_(request.product_ids))
+    )
+    products = (await session.execute(query)).scalars().unique().all()
+    products_by_id = {product.id: product for product in products}
+    return [
+        products_by_id[id]
+        for id in dict.fromkeys(request.product_ids)
+        if id in products_by_id
+    ]
+
+
+@router.get("/{id}", response_model=ProductWithPricesResponse)
 async def get_product_by_id(
     id: int,
-    session: Session = Depends(get_db),
+    session: AsyncSession = Depends(get_db),
 ):
     query = select(Product).options(joinedload(Product.prices)).where(Product.id == id)
-    product = session.execute(query).scalars().unique().one_or_none()
+    product = (await session.execute(query)).scalars().unique().one_or_none()
     if product is None:
         raise HTTPException(status_code=404, detail="Product not found")
 
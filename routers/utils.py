@@ -1,5 +1,14 @@
+import base64
 from datetime import datetime
+import json
+from typing import Callable, List, Sequence
 from fastapi import HTTPException
+from sqlalchemy import Select, tuple_
+from routers.models import Page
+
+# Page size for listings, and the largest page a client may ask for
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
 
 
 def validate_date(date_str: str) -> datetime:
@@ -9,3 +18,54 @@ def validate_date(date_str: str) -> datetime:
         raise HTTPException(
             status_code=400, detail="Invalid date format. Use YYYY-MM-DD."
         )
+
+
+def encode_cursor(*values) -> str:
+    """Packs the sort key of the last returned row into an opaque token."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def is_cursor_value(value, value_type: type) -> bool:
+    # bool is an int in Python, and JSON may write a float without a fraction
+    if isinstance(value, bool):
+        return False
+    if value_type is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, value_type)
+
+
+def decode_cursor(cursor: str, value_types: Sequence[type]) -> List:
+    """Unpacks a cursor, which must hold one value of each of `value_types`."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        values = None
+    if (
+        not isinstance(values, list)
+        or len(values) != len(value_types)
+        or not all(map(is_cursor_value, values, value_types))
+    ):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    return values
+
+
+def select_page(
+    statement: Select, sort_columns: Sequence, limit: int, cursor: str | None
+) -> Select:
+    """
+    Orders `statement` by `sort_columns` and continues after `cursor`. The last
+    sort column must be unique, so every row has a stable position. One extra
+    row is selected to tell whether there is a next page.
+    """
+    if cursor:
+        value_types = [column.type.python_type for column in sort_columns]
+        values = decode_cursor(cursor, value_types)
+        statement = statement.where(tuple_(*sort_columns) > tuple_(*values))
+    return statement.order_by(*sort_columns).limit(limit + 1)
+
+
+def make_page(items: List, limit: int, sort_key: Callable) -> Page:
+    if len(items) <= limit:
+        return Page(items=items, next_cursor=None)
+    items = items[:limit]
+    return Page(items=items, next_cursor=encode_cursor(*sort_key(items[-1])))